@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""文档抽取基准: 比较各抽取后端的单文件耗时,以及长PDF按页分段并行的加速比
+
+用法:
+    python benchmarks/bench_extract.py [--samples DIR] [--rounds N] [--workers 4] [--json OUT]
+
+说明:
+    - DIR 为样例文件目录(*.pdf / *.docx / *.doc / *.xlsx / *.xls,递归查找)
+    - 未指定样例目录时生成合成样例: 1/12/60页PDF、多行XLSX、OLE格式的DOC片段
+    - PDF分别测量 pdfium / pdfplumber,以及 --workers 个进程按页分段并行(pdfium)
+    - 未安装的后端记为不可用; 抽取预算与爬虫一致(extract.DEFAULT_BUDGETS)
+"""
+import argparse
+import glob
+import io
+import json
+import os
+import random
+import sys
+import time
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import extract  # noqa: E402
+from corpus import make_pdf, sentence  # noqa: E402
+
+EXTS = ('.pdf', '.docx', '.doc', '.xlsx', '.xls')
+_SHEET_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+
+
+def synthetic_xlsx(rows, seed=0):
+    # 最小XLSX: 共享字符串表 + 单个工作表(每行: 序号/姓名/单位/备注)
+    rng = random.Random(seed)
+    strings, cells = [], []
+    for r in range(1, rows + 1):
+        row = []
+        for col, value in zip('BCD', (f"学生{r}", sentence(rng, 2, 3), sentence(rng, 4, 8))):
+            strings.append(value)
+            row.append(f'<c r="{col}{r}" t="s"><v>{len(strings) - 1}</v></c>')
+        cells.append(f'<row r="{r}"><c r="A{r}"><v>{r}</v></c>{"".join(row)}</row>')
+    sst = "".join(f"<si><t>{s}</t></si>" for s in strings)
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr('[Content_Types].xml', '<Types/>')
+        z.writestr('xl/workbook.xml',
+                   f'<workbook xmlns="{_SHEET_NS}" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+                   f'<sheets><sheet name="名单" sheetId="1" r:id="rId1"/></sheets></workbook>')
+        z.writestr('xl/_rels/workbook.xml.rels',
+                   '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                   '<Relationship Id="rId1" Target="worksheets/sheet1.xml"/></Relationships>')
+        z.writestr('xl/sharedStrings.xml', f'<sst xmlns="{_SHEET_NS}">{sst}</sst>')
+        z.writestr('xl/worksheets/sheet1.xml', f'<worksheet xmlns="{_SHEET_NS}"><sheetData>{"".join(cells)}</sheetData></worksheet>')
+    return buf.getvalue()
+
+
+def synthetic_doc(paragraphs, seed=0):
+    # 模拟OLE2 Word文件: 文件头 + 二进制结构 + UTF-16LE正文段落
+    rng = random.Random(seed)
+    out = bytearray(b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1' + bytes(504))
+    for _ in range(paragraphs):
+        out += sentence(rng).encode('utf-16-le') + b'\r\x00'
+        out += rng.getrandbits(64 * 8).to_bytes(64, 'little')
+    return bytes(out)
+
+
+def load_samples(samples_dir):
+    if not samples_dir:
+        lines = [f"Notice {i}: scholarship application deadline and required materials" for i in range(40)]
+        return [
+            ('synthetic-1p.pdf', '.pdf', make_pdf(lines, 200_000, pages=1)),
+            ('synthetic-12p.pdf', '.pdf', make_pdf(lines, 500_000, pages=12)),
+            ('synthetic-60p.pdf', '.pdf', make_pdf(lines, 2_000_000, pages=60)),
+            ('synthetic-2000r.xlsx', '.xlsx', synthetic_xlsx(2000, seed=1)),
+            ('synthetic-300p.doc', '.doc', synthetic_doc(300, seed=2)),
+        ]
+    samples = []
+    for path in sorted(glob.glob(os.path.join(samples_dir, '**', '*'), recursive=True)):
+        ext = os.path.splitext(path)[1].lower()
+        if ext in EXTS and os.path.isfile(path):
+            with open(path, 'rb') as f:
+                samples.append((os.path.relpath(path, samples_dir), ext, f.read()))
+    return samples
+
+
+def extract_range(data, ext, backend, pages):
+    # 工作进程: 抽取一个页区间
+    return extract.extract_text(data, ext, pdf_backend=backend, pages=pages)[0]
+
+
+def backend_available(name):
+    try:
+        if name == 'pdfium':
+            import pypdfium2  # noqa: F401
+        elif name == 'pdfplumber':
+            import pdfplumber  # noqa: F401
+        elif name == 'docx':
+            import docx  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def time_call(func, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = func()
+    return (time.perf_counter() - start) / rounds, result
+
+
+def run(samples, rounds, workers, max_pages, per_task):
+    rows = []
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        for name, ext, data in samples:
+            fmt = extract.sniff(data, ext)
+            if fmt == '.pdf':
+                backends = list(extract.PDF_BACKENDS)
+            else:
+                backends = [fmt.lstrip('.')]
+            pages = extract.pdf_page_count(data) if fmt == '.pdf' else None
+            if pages:
+                pages = min(pages, max_pages)   # 实际抽取的页数
+            for backend in backends:
+                if not backend_available(backend):
+                    rows.append({'file': name, 'format': fmt, 'backend': backend, 'error': 'not available'})
+                    continue
+                seconds, (text, info) = time_call(
+                    lambda: extract.extract_text(data, ext, pdf_backend=backend, pages=(0, max_pages)), rounds)
+                rows.append({
+                    'file': name, 'format': fmt, 'backend': info['backend'], 'mode': 'serial',
+                    'bytes': len(data), 'pages': pages, 'chars': len(text), 'truncated': info['truncated'],
+                    'ms': round(seconds * 1000, 3),
+                })
+
+            # 按页分段并行(与爬虫 _submit_parse 相同的分段方式)
+            if pool and pages and pages > per_task and backend_available('pdfium'):
+                ranges = extract.page_ranges(pages, max_pages, per_task)
+                list(pool.map(extract_range, [data] * len(ranges), [ext] * len(ranges),
+                              ['pdfium'] * len(ranges), ranges))  # 预热工作进程
+                seconds, parts = time_call(
+                    lambda: list(pool.map(extract_range, [data] * len(ranges), [ext] * len(ranges),
+                                          ['pdfium'] * len(ranges), ranges)), rounds)
+                rows.append({
+                    'file': name, 'format': fmt, 'backend': 'pdfium', 'mode': f'parallel x{len(ranges)}',
+                    'bytes': len(data), 'pages': pages, 'chars': sum(len(p) for p in parts), 'truncated': None,
+                    'ms': round(seconds * 1000, 3),
+                })
+    finally:
+        if pool:
+            pool.shutdown()
+    return rows
+
+
+def summarize(rows):
+    # 按 (格式, 后端, 模式) 汇总: 平均耗时与吞吐
+    groups = defaultdict(list)
+    for r in rows:
+        if 'error' not in r:
+            groups[(r['format'], r['backend'], r['mode'])].append(r)
+    summary = {}
+    for (fmt, backend, mode), rs in sorted(groups.items()):
+        seconds = sum(r['ms'] for r in rs) / 1000
+        summary[f"{fmt} {backend} {mode}"] = {
+            'files': len(rs),
+            'avg_ms': round(seconds * 1000 / len(rs), 3),
+            'mb_per_sec': round(sum(r['bytes'] for r in rs) / seconds / 1e6, 2) if seconds else None,
+            'pages_per_sec': round(sum(r['pages'] or 0 for r in rs) / seconds, 1) if seconds and fmt == '.pdf' else None,
+            'chars': sum(r['chars'] for r in rs),
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Document extraction benchmark")
+    parser.add_argument('--samples', help="directory of sample documents")
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=4, help="processes for page-parallel PDF extraction")
+    parser.add_argument('--max-pages', type=int, default=6, help="same as crawler Config.PDF_MAX_PAGES")
+    parser.add_argument('--pages-per-task', type=int, default=3,
+                        help="split size to measure (crawler Config.PDF_PAGES_PER_TASK; the crawler only splits "
+                             "when PDF_MAX_PAGES >= PDF_PARALLEL_PAGES)")
+    parser.add_argument('--json', help="write results to this JSON file")
+    args = parser.parse_args()
+
+    samples = load_samples(args.samples)
+    if not samples:
+        print(f"No sample documents found in {args.samples}")
+        sys.exit(1)
+    rows = run(samples, args.rounds, args.workers, args.max_pages, args.pages_per_task)
+
+    print(f"{len(samples)} files x {args.rounds} rounds")
+    for r in rows:
+        if 'error' in r:
+            print(f"  {r['file'][:40]:40s} {r['backend']:10s} {r['error']}")
+        else:
+            print(f"  {r['file'][:40]:40s} {r['backend']:10s} {r['mode']:12s} {r['ms']:10.2f} ms  "
+                  f"chars={r['chars']} truncated={r['truncated']}")
+    summary = summarize(rows)
+    print("Summary:")
+    for key, s in summary.items():
+        print(f"  {key:32s} {s['avg_ms']:10.2f} ms/file  {s['mb_per_sec']} MB/s  pages/s={s['pages_per_sec']}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'benchmark': 'extract', 'files': len(samples), 'rounds': args.rounds,
+                       'workers': args.workers, 'results': rows, 'summary': summary}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
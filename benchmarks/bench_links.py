@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""链接提取基准: 比较 bs4 / lxml / regex 三种提取方式的单页耗时
+
+用法:
+    python benchmarks/bench_links.py [--pages DIR] [--rounds N] [--json OUT]
+
+说明:
+    - DIR 为保存的HTML样例页目录(*.html / *.htm),文件名中的URL用于解析相对链接:
+      可在同名 .url 文件中写入页面原始URL,缺省为 https://www.ustc.edu.cn/
+    - 未指定样例目录时生成模拟的"下载中心"列表页(数百个链接)
+    - 以 bs4 结果为基准校验其他方式提取的链接集合是否一致
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from linkextract import EXTRACTORS, normalize_links  # noqa: E402
+from urlfilter import UrlFilter  # noqa: E402
+
+DEFAULT_BASE = "https://www.ustc.edu.cn/"
+
+
+def synthetic_page(n_links, seed=0):
+    # 模拟下载中心列表页: 导航栏 + 文件列表 + 分页 + 外链
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n_links):
+        ext = rng.choice(['.pdf', '.doc', '.docx', '.htm', '.xls'])
+        href = rng.choice([
+            f"/_upload/article/files/{rng.getrandbits(32):08x}/{i}{ext}",
+            f"../download/{i}/list.htm",
+            f"https://www.teach.ustc.edu.cn/download/{i}{ext}?id={i}&amp;t=1",
+            f"'https://finance.ustc.edu.cn/{i}/page.psp'",
+            f"https://www.example.com/{i}",
+            "javascript:void(0)",
+        ])
+        quote = "'" if href.startswith("'") else '"'
+        href = href.strip("'")
+        rows.append(f'<li><span class="date">2025-0{i % 9 + 1}-1{i % 9}</span>'
+                    f'<a class="title" target="_blank" href={quote}{href}{quote} title="第{i}号文件">'
+                    f'关于做好2025年秋季学期第{i}项工作的通知</a></li>')
+    nav = "".join(f'<a href="/{i}/list.htm">栏目{i}</a>' for i in range(30))
+    return (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>下载中心</title></head>'
+            f'<body><div class="nav">{nav}</div><ul class="list">{"".join(rows)}</ul>'
+            f'<div class="pages"><a href="?page=2">下一页</a></div></body></html>').encode('utf-8')
+
+
+def load_pages(pages_dir, n_synthetic):
+    if not pages_dir:
+        return [(f"synthetic-{n}", DEFAULT_BASE, synthetic_page(n, seed=n)) for n in n_synthetic]
+    pages = []
+    for path in sorted(glob.glob(os.path.join(pages_dir, '*.htm*'))):
+        base = DEFAULT_BASE
+        url_file = os.path.splitext(path)[0] + '.url'
+        if os.path.exists(url_file):
+            with open(url_file, encoding='utf-8') as f:
+                base = f.read().strip() or DEFAULT_BASE
+        with open(path, 'rb') as f:
+            pages.append((os.path.basename(path), base, f.read()))
+    return pages
+
+
+def run(pages, rounds, domain):
+    results = {}
+    baseline = {}
+    for name, extract in EXTRACTORS.items():
+        try:
+            extract(b'<html></html>')
+        except ImportError as e:
+            results[name] = {'error': f"not available: {e}"}
+            continue
+        total = 0.0
+        links = 0
+        mismatched = []
+        for page_name, base, content in pages:
+            url_filter = UrlFilter(domain)
+            start = time.perf_counter()
+            for _ in range(rounds):
+                found = normalize_links(base, extract(content, 'utf-8'), url_filter)
+            total += time.perf_counter() - start
+            links += len(found)
+            urls = {link[0] for link in found}
+            if name == 'bs4':
+                baseline[page_name] = urls
+            elif page_name in baseline and urls != baseline[page_name]:
+                mismatched.append(page_name)
+        per_page = total / (rounds * len(pages))
+        results[name] = {
+            'ms_per_page': round(per_page * 1000, 3),
+            'pages_per_sec': round(1 / per_page, 1) if per_page else None,
+            'links': links,
+            'mismatched_pages': mismatched,
+        }
+    if 'ms_per_page' in results.get('bs4', {}):
+        for name, r in results.items():
+            if 'ms_per_page' in r:
+                r['speedup_vs_bs4'] = round(results['bs4']['ms_per_page'] / r['ms_per_page'], 2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Link extraction benchmark")
+    parser.add_argument('--pages', help="directory of saved HTML sample pages")
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--domain', default='ustc.edu.cn')
+    parser.add_argument('--json', help="write results to this JSON file")
+    args = parser.parse_args()
+
+    pages = load_pages(args.pages, [50, 300, 1000])
+    if not pages:
+        print(f"No sample pages found in {args.pages}")
+        sys.exit(1)
+    results = run(pages, args.rounds, args.domain)
+
+    print(f"{len(pages)} pages x {args.rounds} rounds")
+    for name, r in results.items():
+        if 'error' in r:
+            print(f"  {name:6s} {r['error']}")
+        else:
+            print(f"  {name:6s} {r['ms_per_page']:8.3f} ms/page  {r.get('speedup_vs_bs4', '-')}x  "
+                  f"links={r['links']}  mismatched={len(r['mismatched_pages'])}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'benchmark': 'links', 'pages': len(pages), 'rounds': args.rounds,
+                       'results': results}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""合成语料: 生成与生产表结构一致的文档(meta/data/index 列族)及对应的原始文件
+
+说明:
+    - 正文由校园通知常用词随机组句,长度与真实摘要(data:content 最多5000字)相近
+    - 原始文件为最小合法PDF(正文为ASCII占位文本,附加填充流以达到目标大小)
+    - 行键与爬虫一致: URL的MD5十六进制; HDFS文件名: 内容MD5 + 扩展名
+"""
+import hashlib
+import random
+
+# 校园文档常见词汇(名词/动词/修饰词),组句时按类别交替
+NOUNS = [
+    '教务处', '研究生院', '本科生', '研究生', '奖学金', '助学金', '课程', '选课', '考试', '成绩', '学位',
+    '论文', '答辩', '导师', '培养方案', '学籍', '学分', '教学计划', '实验室', '科研项目', '经费', '报销',
+    '财务处', '学生工作部', '团委', '志愿服务', '社会实践', '招生', '推免', '复试', '录取', '开题报告',
+    '中期考核', '教材', '课表', '学期', '校历', '网络安全', '计算机学院', '信息科学', '数据科学',
+    '图书馆', '数据库', '申请表', '登记表', '证明', '通知', '办法', '细则', '规定', '流程', '附件',
+]
+VERBS = [
+    '申请', '提交', '审核', '发布', '组织', '开展', '完成', '办理', '填写', '下载', '参加', '报名',
+    '评审', '公示', '修订', '执行', '落实', '安排', '确认', '登记',
+]
+MODIFIERS = [
+    '关于', '做好', '2025年', '秋季学期', '春季学期', '全日制', '非全日制', '年度', '第二批', '相关',
+    '有关', '进一步', '规范', '校级', '院级', '国家级', '专项', '优秀', '线上', '线下',
+]
+PUNCT = ['，', '，', '、', '。', '；']
+
+
+def sentence(rng, min_words=6, max_words=16):
+    words = []
+    for i in range(rng.randint(min_words, max_words)):
+        pool = (MODIFIERS, NOUNS, VERBS, NOUNS)[i % 4]
+        words.append(rng.choice(pool))
+        if i and i % 5 == 0:
+            words.append(rng.choice(PUNCT[:3]))
+    return ''.join(words) + '。'
+
+
+def paragraph(rng, chars):
+    parts = []
+    size = 0
+    while size < chars:
+        s = sentence(rng)
+        parts.append(s)
+        size += len(s)
+    return ''.join(parts)[:chars]
+
+
+def title(rng):
+    return f"{rng.choice(MODIFIERS)}{rng.choice(MODIFIERS)}{rng.choice(NOUNS)}{rng.choice(VERBS)}{rng.choice(NOUNS)}"
+
+
+def make_pdf(lines, size=0, pages=1):
+    """生成最小合法PDF
+
+    参数:
+        lines: 页面文本行(ASCII)
+        size: 目标字节数(通过不可压缩的填充流补足)
+        pages: 页数(各页共用同一内容流)
+    """
+    text = "\n".join(f"({line.replace('(', '[').replace(')', ']')}) Tj 0 -16 Td" for line in lines)
+    stream = f"BT /F1 12 Tf 72 720 Td {text} ET".encode('latin-1', 'ignore')
+    first_page = 5
+    kids = " ".join(f"{first_page + i} 0 R" for i in range(pages)).encode()
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % pages,
+        b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    objects += [b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 3 0 R "
+                b"/Resources << /Font << /F1 4 0 R >> >> >>"] * pages
+    pad = max(0, size - 600 - len(stream))
+    if pad:
+        # 未被引用的填充对象(随机字节不可压缩,模拟扫描件体积)
+        filler = random.Random(size).getrandbits(pad * 8).to_bytes(pad, 'little')
+        objects.append(b"<< /Length %d >>\nstream\n" % len(filler) + filler + b"\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for i, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for off in offsets:
+        out += b"%010d 00000 n \n" % off
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def generate(n_docs, seed=42, content_chars=(800, 5000), file_size=(50_000, 2_000_000),
+             hdfs_root="/search_engine/raw_data", base_url="https://www.teach.ustc.edu.cn/_upload/files"):
+    """生成文档(生成器)
+
+    返回:
+        (row_key, row_data, hdfs_path, file_bytes) 序列
+    """
+    rng = random.Random(seed)
+    for i in range(n_docs):
+        url = f"{base_url}/{i:06d}.pdf"
+        row_key = hashlib.md5(url.encode()).hexdigest().encode()
+        doc_title = f"{title(rng)}{i}.pdf"
+        content = paragraph(rng, rng.randint(*content_chars))
+        keywords = ",".join(rng.sample(NOUNS, 5))
+        pdf = make_pdf([f"Synthetic document {i}", url], rng.randint(*file_size))
+        hdfs_path = f"{hdfs_root}/{hashlib.md5(pdf).hexdigest()}.pdf"
+        yield row_key, {
+            b'meta:url': url.encode(),
+            b'meta:title': doc_title.encode('utf-8'),
+            b'meta:type': b'file',
+            b'meta:date': f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}".encode(),
+            b'data:hdfs_path': hdfs_path.encode(),
+            b'data:content': content.encode('utf-8'),
+            b'index:keywords': keywords.encode('utf-8'),
+        }, hdfs_path, pdf
+
+
+def populate(conn, hdfs, n_docs, data_table, index_table, seed=42, **kwargs):
+    """写入合成语料: 数据表行 + HDFS文件 + 倒排索引(全量构建)
+
+    返回:
+        [(row_key, 标题)] 用于构造查询与下载请求
+    """
+    from indexer import InvertedIndex
+
+    docs = []
+    with conn.table(data_table).batch(batch_size=500) as batch:
+        for row_key, data, hdfs_path, pdf in generate(n_docs, seed=seed, **kwargs):
+            batch.put(row_key, data)
+            hdfs.put(hdfs_path, pdf)
+            docs.append((row_key, data[b'meta:title'].decode('utf-8')))
+    InvertedIndex(conn, data_table, index_table).build()
+    return docs
@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+"""内存版 happybase 替身(仅实现本项目用到的接口)
+
+说明:
+    - 所有连接共享同一份进程内"服务端"数据(模拟同一HBase集群)
+    - 行键按字节序有序存储,scan 支持 row_start/row_stop/columns
+    - rpc_latency 为每次RPC附加的模拟网络延迟(秒),用于近似Thrift往返开销
+    - install() 替换 happybase.Connection / 连接池中的 Connection,爬虫与Web应用无需修改
+"""
+import bisect
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+# happybase计数器编码: 8字节有符号大端整数
+_COUNTER = struct.Struct('>q')
+
+
+class _Server:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.tables = {}            # name -> _TableData
+        self.rpc_latency = 0.0
+        self.rpc_count = 0
+
+    def rpc(self):
+        self.rpc_count += 1
+        if self.rpc_latency:
+            time.sleep(self.rpc_latency)
+
+    def reset(self):
+        with self.lock:
+            self.tables.clear()
+            self.rpc_count = 0
+
+
+SERVER = _Server()
+
+
+def _name(name):
+    return name.decode() if isinstance(name, bytes) else name
+
+
+def _bytes(value):
+    return value.encode() if isinstance(value, str) else value
+
+
+class _TableData:
+    def __init__(self, families):
+        self.families = families
+        self.rows = {}              # row_key -> {column: value}
+        self.keys = []              # 有序行键
+
+
+def _select(cells, columns):
+    # columns 元素为列族(b'p')或完整列名(b'meta:title')
+    if not columns:
+        return dict(cells)
+    cols = [_bytes(c) for c in columns]
+    families = tuple(c + b':' for c in cols if b':' not in c)
+    exact = {c for c in cols if b':' in c}
+    return {k: v for k, v in cells.items() if k in exact or (families and k.startswith(families))}
+
+
+class FakeTable:
+    def __init__(self, name, connection):
+        self.name = _bytes(name)
+        self.connection = connection
+
+    def _data(self):
+        data = SERVER.tables.get(_name(self.name))
+        if data is None:
+            raise IOError(f"TableNotFoundException: {_name(self.name)}")
+        return data
+
+    def families(self):
+        SERVER.rpc()
+        return {_bytes(f): opts for f, opts in self._data().families.items()}
+
+    def row(self, row, columns=None, timestamp=None, include_timestamp=False):
+        SERVER.rpc()
+        with SERVER.lock:
+            cells = self._data().rows.get(_bytes(row))
+            return _select(cells, columns) if cells else {}
+
+    def rows(self, rows, columns=None, timestamp=None, include_timestamp=False):
+        SERVER.rpc()
+        result = []
+        with SERVER.lock:
+            data = self._data()
+            for key in rows:
+                key = _bytes(key)
+                cells = data.rows.get(key)
+                if cells:
+                    selected = _select(cells, columns)
+                    if selected:
+                        result.append((key, selected))
+        return result
+
+    def scan(self, row_start=None, row_stop=None, row_prefix=None, columns=None, filter=None,
+             timestamp=None, include_timestamp=False, batch_size=1000, scan_batching=None,
+             limit=None, sorted_columns=False, reverse=False):
+        if row_prefix is not None:
+            row_start = _bytes(row_prefix)
+            row_stop = row_start[:-1] + bytes([row_start[-1] + 1]) if row_start else None
+        with SERVER.lock:
+            keys = self._data().keys
+            lo = bisect.bisect_left(keys, _bytes(row_start)) if row_start else 0
+            hi = bisect.bisect_left(keys, _bytes(row_stop)) if row_stop else len(keys)
+            keys = keys[lo:hi]
+        returned = 0
+        # 按 batch_size 分批取回,每批一次RPC
+        for i in range(0, len(keys), batch_size):
+            SERVER.rpc()
+            with SERVER.lock:
+                data = self._data()
+                chunk = []
+                for key in keys[i:i + batch_size]:
+                    cells = data.rows.get(key)
+                    if cells:
+                        selected = _select(cells, columns)
+                        if selected:
+                            chunk.append((key, selected))
+            for item in chunk:
+                yield item
+                returned += 1
+                if limit is not None and returned >= limit:
+                    return
+
+    def _put(self, data, row, values):
+        row = _bytes(row)
+        cells = data.rows.get(row)
+        if cells is None:
+            cells = data.rows[row] = {}
+            bisect.insort(data.keys, row)
+        for col, value in values.items():
+            cells[_bytes(col)] = _bytes(value)
+
+    def _delete(self, data, row, columns=None):
+        row = _bytes(row)
+        cells = data.rows.get(row)
+        if cells is None:
+            return
+        if columns is None:
+            del data.rows[row]
+        else:
+            for col in list(_select(cells, columns)):
+                del cells[col]
+            if cells:
+                return
+            del data.rows[row]
+        data.keys.pop(bisect.bisect_left(data.keys, row))
+
+    def put(self, row, data, timestamp=None, wal=True):
+        SERVER.rpc()
+        with SERVER.lock:
+            self._put(self._data(), row, data)
+
+    def delete(self, row, columns=None, timestamp=None, wal=True):
+        SERVER.rpc()
+        with SERVER.lock:
+            self._delete(self._data(), row, columns)
+
+    def batch(self, timestamp=None, batch_size=None, transaction=False, wal=True):
+        return FakeBatch(self, batch_size)
+
+    def counter_get(self, row, column):
+        return self.counter_inc(row, column, 0)
+
+    def counter_set(self, row, column, value=0):
+        SERVER.rpc()
+        with SERVER.lock:
+            self._put(self._data(), row, {column: _COUNTER.pack(value)})
+
+    def counter_inc(self, row, column, value=1):
+        SERVER.rpc()
+        with SERVER.lock:
+            data = self._data()
+            cells = data.rows.get(_bytes(row), {})
+            current = _COUNTER.unpack(cells[_bytes(column)])[0] if _bytes(column) in cells else 0
+            current += value
+            if value or _bytes(column) in cells:
+                self._put(data, row, {column: _COUNTER.pack(current)})
+            return current
+
+    def counter_dec(self, row, column, value=1):
+        return self.counter_inc(row, column, -value)
+
+
+class FakeBatch:
+    def __init__(self, table, batch_size=None):
+        self.table = table
+        self.batch_size = batch_size
+        self._mutations = []
+
+    def put(self, row, data, wal=None):
+        self._mutations.append(('put', row, data))
+        self._maybe_send()
+
+    def delete(self, row, columns=None, wal=None):
+        self._mutations.append(('delete', row, columns))
+        self._maybe_send()
+
+    def _maybe_send(self):
+        if self.batch_size and len(self._mutations) >= self.batch_size:
+            self.send()
+
+    def send(self):
+        if not self._mutations:
+            return
+        SERVER.rpc()
+        with SERVER.lock:
+            data = self.table._data()
+            for op, row, arg in self._mutations:
+                if op == 'put':
+                    self.table._put(data, row, arg)
+                else:
+                    self.table._delete(data, row, arg)
+        self._mutations = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # 与happybase一致: 非事务批量在异常时也提交已缓冲的修改
+        self.send()
+
+
+class FakeConnection:
+    def __init__(self, host='localhost', port=9090, timeout=None, autoconnect=True,
+                 table_prefix=None, table_prefix_separator=b'_', compat='0.98',
+                 transport='buffered', protocol='binary'):
+        self.host = host
+        self.port = port
+        self.table_prefix = table_prefix
+        self._open = False
+        if autoconnect:
+            self.open()
+
+    def open(self):
+        self._open = True
+
+    def close(self):
+        self._open = False
+
+    def table(self, name, use_prefix=True):
+        return FakeTable(name, self)
+
+    def tables(self):
+        SERVER.rpc()
+        with SERVER.lock:
+            return [n.encode() for n in SERVER.tables]
+
+    def create_table(self, name, families):
+        SERVER.rpc()
+        with SERVER.lock:
+            name = _name(name)
+            if name in SERVER.tables:
+                raise IOError(f"TableExistsException: {name}")
+            SERVER.tables[name] = _TableData(dict(families))
+
+    def delete_table(self, name, disable=False):
+        SERVER.rpc()
+        with SERVER.lock:
+            SERVER.tables.pop(_name(name), None)
+
+    def enable_table(self, name):
+        pass
+
+    def disable_table(self, name):
+        pass
+
+    def is_table_enabled(self, name):
+        return True
+
+
+class FakeConnectionPool:
+    """happybase.ConnectionPool 替身(支持 connection(timeout) 与 _queue)"""
+
+    def __init__(self, size, **kwargs):
+        import queue
+        self.size = size
+        self._queue = queue.LifoQueue(maxsize=size)
+        for _ in range(size):
+            kwargs['autoconnect'] = False
+            self._queue.put(FakeConnection(**kwargs))
+
+    @contextmanager
+    def connection(self, timeout=None):
+        import queue
+        try:
+            conn = self._queue.get(True, timeout)
+        except queue.Empty:
+            raise _no_connections()("No connection available from pool within specified timeout")
+        try:
+            conn.open()
+            yield conn
+        finally:
+            self._queue.put(conn)
+
+
+def _no_connections():
+    try:
+        import happybase
+        return happybase.NoConnectionsAvailable
+    except ImportError:
+        return RuntimeError
+
+
+def install(rpc_latency=0.0):
+    """用内存替身替换 happybase 的连接类(进程内生效)
+
+    参数:
+        rpc_latency: 每次RPC的模拟延迟(秒)
+    """
+    import happybase
+    SERVER.rpc_latency = rpc_latency
+    happybase.Connection = FakeConnection
+    happybase.ConnectionPool = FakeConnectionPool
+    return SERVER
+
+
+def create_schema(conn, data_table, index_table=None, registry_table=None):
+    # 创建与生产一致的表结构(数据表: meta/data/index 列族)
+    names = {_name(n) for n in conn.tables()}
+    if data_table not in names:
+        conn.create_table(data_table, {'meta': {}, 'data': {}, 'index': {}})
+    if index_table and index_table not in names:
+        conn.create_table(index_table, {'p': dict(max_versions=1), 's': dict(max_versions=1)})
+    if registry_table and registry_table not in names:
+        conn.create_table(registry_table, {'d': dict(max_versions=1)})
+
+
+def table_sizes():
+    # 各表行数(基准报告使用)
+    with SERVER.lock:
+        return {name: len(data.rows) for name, data in SERVER.tables.items()}
+
@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""端到端基准: 无需真实集群,使用内存HBase替身、本地目录HDFS与本地模拟站点
+
+用法:
+    python benchmarks/run.py [--docs 2000] [--concurrency 16] [--duration 10]
+                             [--only search,download,crawler] [--out FILE] [--compare OLD.json]
+
+测量项:
+    - search:   /search 延迟(p50/p99)与QPS(分别测量关闭/开启结果缓存)
+    - download: /download 吞吐(MB/s)与延迟
+    - crawler:  爬虫 页面/秒 与 文件/秒(本地站点,礼貌延时置零)
+结果写入JSON(含提交号),--compare 可与历史结果对比以发现性能回退
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'webapp')]
+
+import requests  # noqa: E402
+
+import corpus  # noqa: E402
+import fake_hbase  # noqa: E402
+from hdfs_backend import LocalBackend  # noqa: E402
+from site_server import SiteServer  # noqa: E402
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def load_test(make_url, concurrency, duration, stream=False):
+    """并发压测: concurrency个客户端线程在duration秒内循环请求
+
+    返回:
+        延迟分位数(毫秒)、QPS、错误数与传输字节数
+    """
+    deadline = time.perf_counter() + duration
+    rng_lock = threading.Lock()
+    rng = random.Random(1)
+
+    def client():
+        session = requests.Session()
+        latencies, errors, nbytes = [], 0, 0
+        while time.perf_counter() < deadline:
+            with rng_lock:
+                url = make_url(rng)
+            start = time.perf_counter()
+            try:
+                resp = session.get(url, stream=stream, timeout=30)
+                if stream:
+                    for chunk in resp.iter_content(64 * 1024):
+                        nbytes += len(chunk)
+                else:
+                    nbytes += len(resp.content)
+                if resp.status_code >= 400:
+                    errors += 1
+            except requests.RequestException:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+        session.close()
+        return latencies, errors, nbytes
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: client(), range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(l for r in results for l in r[0])
+    nbytes = sum(r[2] for r in results)
+    return {
+        'requests': len(latencies),
+        'errors': sum(r[1] for r in results),
+        'concurrency': concurrency,
+        'seconds': round(elapsed, 3),
+        'qps': round(len(latencies) / elapsed, 2),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3) if latencies else None,
+        'p90_ms': round(percentile(latencies, 0.90) * 1000, 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+        'max_ms': round(latencies[-1] * 1000, 3) if latencies else None,
+        'mb_per_sec': round(nbytes / elapsed / 1e6, 2),
+    }
+
+
+class WebServer:
+    # 在后台线程中运行uvicorn(与生产相同的ASGI栈)
+    def __init__(self, app):
+        import uvicorn
+        self.port = free_port()
+        self.server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=self.port, log_level='warning'))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+        return f"http://127.0.0.1:{self.port}"
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+def bench_webapp(args, workdir, only):
+    import app as webapp
+
+    hdfs = LocalBackend(os.path.join(workdir, 'hdfs'))
+    webapp.hdfs = hdfs
+    webapp.SEARCH_MODE = args.search_mode
+
+    conn = fake_hbase.FakeConnection()
+    fake_hbase.create_schema(conn, webapp.TABLE_NAME, webapp.INDEX_TABLE)
+    start = time.perf_counter()
+    docs = corpus.populate(conn, hdfs, args.docs, webapp.TABLE_NAME, webapp.INDEX_TABLE,
+                           file_size=(args.file_kb_min * 1024, args.file_kb_max * 1024))
+    print(f"Corpus: {args.docs} docs generated and indexed in {time.perf_counter() - start:.1f}s")
+
+    queries = corpus.NOUNS + [t[:4] for _, t in docs[:200]]
+    results = {}
+    with WebServer(webapp.app) as base:
+        if 'search' in only:
+            search = {}
+            for label, max_bytes in (('no_cache', 0), ('cached', webapp.CACHE_MAX_BYTES)):
+                webapp.result_cache.clear()
+                webapp.result_cache.max_bytes = max_bytes
+                search[label] = load_test(
+                    lambda rng: f"{base}/search?q={rng.choice(queries)}&page={rng.randint(1, 3)}",
+                    args.concurrency, args.duration)
+                print(f"  search[{label}]: {search[label]}")
+            search['mode'] = args.search_mode
+            results['search'] = search
+        if 'download' in only:
+            keys = [k.decode() for k, _ in docs]
+            results['download'] = load_test(lambda rng: f"{base}/download/{rng.choice(keys)}",
+                                            args.concurrency, args.duration, stream=True)
+            print(f"  download: {results['download']}")
+        results['stats'] = requests.get(f"{base}/stats", timeout=10).json()
+    results['corpus'] = {'docs': args.docs, 'tables': fake_hbase.table_sizes()}
+    return results
+
+
+def bench_crawler(args, workdir):
+    import crawler
+
+    site = SiteServer(hosts=args.crawl_hosts, pages=args.crawl_site_pages,
+                      file_size=(args.file_kb_min * 1024, args.file_kb_max * 1024),
+                      latency=args.site_latency_ms / 1000).start()
+    cfg = crawler.Config
+    cfg.MAX_PAGES = args.crawl_pages
+    cfg.MAX_CONCURRENCY = args.crawl_concurrency
+    cfg.DELAY_INITIAL = 0.0
+    cfg.DELAY_MIN = 0.0
+    cfg.HOST_DELAYS = {}
+    cfg.DOMAIN_LIMIT = '127.0.0.1'
+    cfg.ROBOTS_ENABLED = False
+    cfg.SITEMAP_SEEDING = False
+    cfg.MAX_URLS_PER_HOST = 0
+    cfg.MAX_URLS_PER_PATTERN = 0
+    cfg.RECRAWL_MODE = False
+    cfg.STATE_DIR = os.path.join(workdir, 'crawl_state')
+    cfg.CHECKPOINT_INTERVAL = 1e9
+    cfg.HBASE_JOURNAL = os.path.join(workdir, 'hbase_journal.jsonl')
+    cfg.HDFS_BACKEND = 'local'
+    cfg.HDFS_FALLBACK = None
+    cfg.HDFS_LOCAL_ROOT = os.path.join(workdir, 'crawl_hdfs')
+    crawler.logger.setLevel('WARNING')
+
+    fake_hbase.create_schema(fake_hbase.FakeConnection(), cfg.TABLE_NAME)
+    try:
+        c = crawler.USTCCrawler(site.seeds())
+        c.run()
+    finally:
+        site.stop()
+    elapsed = time.time() - c.start_time
+    return {
+        'urls': c.page_count,
+        'html_pages': site.requests['html'],
+        'files': c.file_count,
+        'seconds': round(elapsed, 3),
+        'urls_per_sec': round(c.page_count / elapsed, 2),
+        'pages_per_sec': round(site.requests['html'] / elapsed, 2),
+        'files_per_sec': round(c.file_count / elapsed, 2),
+        'mb_fetched': round(site.requests['bytes'] / 1e6, 2),
+        'stages': {stage: {'count': n, 'avg_ms': round(busy / n * 1000, 3)}
+                   for stage, (n, busy) in c.meter._stats.items() if n},
+        'concurrency': args.crawl_concurrency,
+        'hosts': args.crawl_hosts,
+    }
+
+
+def git_revision():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def flatten(d, prefix=''):
+    for k, v in d.items():
+        if isinstance(v, dict):
+            yield from flatten(v, f"{prefix}{k}.")
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            yield f"{prefix}{k}", v
+
+
+def compare(old, new):
+    # 对比关键指标(吞吐类越大越好,延迟类越小越好)
+    keys = ('qps', 'p50_ms', 'p99_ms', 'mb_per_sec', 'pages_per_sec', 'files_per_sec')
+    old_flat = dict(flatten(old.get('results', {})))
+    print(f"Compare with {old.get('meta', {}).get('revision')}:")
+    for key, value in flatten(new['results']):
+        if key.rsplit('.', 1)[-1] in keys and old_flat.get(key):
+            change = (value - old_flat[key]) / old_flat[key] * 100
+            print(f"  {key:40s} {old_flat[key]:>10} -> {value:<10} ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark with local stand-ins")
+    parser.add_argument('--only', default='search,download,crawler')
+    parser.add_argument('--docs', type=int, default=2000, help="synthetic corpus size")
+    parser.add_argument('--file-kb-min', type=int, default=50)
+    parser.add_argument('--file-kb-max', type=int, default=1024)
+    parser.add_argument('--rpc-latency-ms', type=float, default=0.5, help="simulated HBase RPC latency")
+    parser.add_argument('--search-mode', default='index', choices=['index', 'scan'])
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds per load test")
+    parser.add_argument('--crawl-pages', type=int, default=500, help="crawler MAX_PAGES")
+    parser.add_argument('--crawl-concurrency', type=int, default=8)
+    parser.add_argument('--crawl-hosts', type=int, default=4)
+    parser.add_argument('--crawl-site-pages', type=int, default=300)
+    parser.add_argument('--site-latency-ms', type=float, default=5.0)
+    parser.add_argument('--out', help="result JSON path (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument('--compare', help="previous result JSON to compare against")
+    args = parser.parse_args()
+    only = set(args.only.split(','))
+
+    fake_hbase.install(rpc_latency=args.rpc_latency_ms / 1000)
+    workdir = tempfile.mkdtemp(prefix='ustc_bench_')
+    results = {}
+    try:
+        if only & {'search', 'download'}:
+            results.update(bench_webapp(args, workdir, only))
+        if 'crawler' in only:
+            fake_hbase.SERVER.reset()
+            results['crawler'] = bench_crawler(args, workdir)
+            print(f"  crawler: {results['crawler']}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'args': vars(args),
+        },
+        'results': results,
+    }
+    out = args.out or os.path.join(BENCH_DIR, 'results', time.strftime("bench-%Y%m%d-%H%M%S.json"))
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Results written to {out}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
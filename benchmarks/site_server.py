@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""本地模拟站点: 生成列表页(HTML)与文档(PDF),供爬虫吞吐量基准使用
+
+说明:
+    - 启动 hosts 个监听不同端口的HTTP服务,页面按编号分布到各主机(爬虫按主机并行调度)
+    - 列表页 /list/<i>.htm: 若干指向其他列表页与 /files/<j>.pdf 的链接
+    - 文档 /files/<j>.pdf: 确定性生成的最小PDF,大小在 file_size 区间内
+    - latency 为每个响应附加的模拟服务端延迟(秒)
+"""
+import functools
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from corpus import make_pdf, title
+
+
+class SiteServer:
+    def __init__(self, hosts=4, pages=200, links_per_page=20, files_per_page=5,
+                 file_size=(20_000, 300_000), latency=0.0, seed=7):
+        self.n_hosts = hosts
+        self.pages = pages
+        self.links_per_page = links_per_page
+        self.files_per_page = files_per_page
+        self.file_size = file_size
+        self.latency = latency
+        self.seed = seed
+        self.servers = []
+        self.requests = {'html': 0, 'pdf': 0, 'bytes': 0}
+        self._lock = threading.Lock()
+
+    # -- 站点内容 --
+
+    def base(self, n):
+        host, port = self.servers[n % self.n_hosts].server_address[:2]
+        return f"http://{host}:{port}"
+
+    def page_url(self, i):
+        return f"{self.base(i)}/list/{i}.htm"
+
+    def file_url(self, j):
+        return f"{self.base(j)}/files/{j}.pdf"
+
+    def seeds(self):
+        return [self.page_url(i) for i in range(min(self.n_hosts, self.pages))]
+
+    def render_page(self, i):
+        rng = random.Random(self.seed * 1_000_003 + i)
+        items = []
+        for _ in range(self.links_per_page):
+            k = rng.randrange(self.pages)
+            items.append(f'<li><a href="{self.page_url(k)}">{title(rng)}</a></li>')
+        for _ in range(self.files_per_page):
+            j = rng.randrange(self.pages * self.files_per_page)
+            items.append(f'<li><a href="{self.file_url(j)}" title="{title(rng)}">{title(rng)}.pdf</a></li>')
+        return (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>下载中心 第{i}页</title></head>'
+                f'<body><ul class="list">{"".join(items)}</ul></body></html>').encode('utf-8')
+
+    @functools.lru_cache(maxsize=512)
+    def render_file(self, j):
+        rng = random.Random(self.seed * 7_000_003 + j)
+        return make_pdf([f"Benchmark file {j}"], rng.randint(*self.file_size))
+
+    # -- HTTP服务 --
+
+    def _handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                if site.latency:
+                    time.sleep(site.latency)
+                path = self.path.split('?')[0]
+                try:
+                    if path.startswith('/list/') and path.endswith('.htm'):
+                        body, ctype, kind = site.render_page(int(path[6:-4])), 'text/html; charset=utf-8', 'html'
+                    elif path.startswith('/files/') and path.endswith('.pdf'):
+                        body, ctype, kind = site.render_file(int(path[7:-4])), 'application/pdf', 'pdf'
+                    else:
+                        raise ValueError(path)
+                except ValueError:
+                    self.send_error(404)
+                    return
+                with site._lock:
+                    site.requests[kind] += 1
+                    site.requests['bytes'] += len(body)
+                self.send_response(200)
+                self.send_header('Content-Type', ctype)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        handler = self._handler()
+        for _ in range(self.n_hosts):
+            server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self.servers.append(server)
+        return self
+
+    def stop(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        self.servers = []
@@ -0,0 +1,383 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import re
+import signal
+import threading
+import time
+import zipfile
+from contextlib import contextmanager
+from xml.etree import ElementTree
+
+# 文件头魔数: 按实际内容选择抽取方式(URL后缀与Content-Type不可靠, 如 .doc 链接实际为 .docx)
+_MAGIC_PDF = b'%PDF'
+_MAGIC_ZIP = b'PK\x03\x04'
+_MAGIC_OLE = b'\xd0\xcf\x11\xe0'   # OLE2复合文档(.doc / .xls)
+
+# 各格式默认预算: (最大字节数, 最长秒数); 超过大小不抽取,超时返回已抽取部分
+DEFAULT_BUDGETS = {
+    '.pdf': (15 * 1024 * 1024, 30.0),
+    '.docx': (10 * 1024 * 1024, 10.0),
+    '.doc': (10 * 1024 * 1024, 10.0),
+    '.xlsx': (10 * 1024 * 1024, 15.0),
+    '.xls': (10 * 1024 * 1024, 10.0),
+}
+
+# 按UTF-16LE解码后的文本片段(ASCII可见字符/中日韩统一表意文字/中文标点/全角字符),至少4个字符
+_TEXT_RUN_RE = re.compile('[\u0020-\u007e\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]{4,}')
+_CJK_RE = re.compile('[\u4e00-\u9fff]')
+
+_SHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+
+# PDFium非线程安全(同一进程内不同文档的调用也不能并发): 所有pypdfium2调用持有该锁
+# 抓取线程在主进程中统计页数时串行执行; 解析进程单线程,加锁无竞争
+_PDFIUM_LOCK = threading.Lock()
+_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+
+
+class ExtractTimeout(Exception):
+    pass
+
+
+class _Full(Exception):
+    # 已达到字符上限
+    pass
+
+
+class _Collector:
+    # 累积抽取结果; 达到字符上限或超过截止时间时抛出异常,已抽取部分保留
+    def __init__(self, max_chars, deadline):
+        self.parts = []
+        self.chars = 0
+        self.max_chars = max_chars
+        self.deadline = deadline
+        self.truncated = None
+
+    def add(self, text):
+        if not text:
+            return
+        self.parts.append(text)
+        self.chars += len(text)
+        if self.max_chars and self.chars >= self.max_chars:
+            self.truncated = 'chars'
+            raise _Full()
+        if self.deadline and time.monotonic() > self.deadline:
+            raise ExtractTimeout()
+
+    def text(self):
+        text = "\n".join(self.parts).strip()
+        return text[:self.max_chars] if self.max_chars else text
+
+
+@contextmanager
+def time_limit(seconds):
+    """硬性时间上限: 仅在支持 setitimer 的平台且在主线程中生效(解析进程池的工作进程满足)
+
+    说明:
+        - 信号在字节码之间处理,单次C调用(如渲染一页)结束后才会中断
+        - 其他情况下仅依赖 _Collector 的截止时间检查(每页/每段/每行)
+    """
+    if not seconds or not hasattr(signal, 'setitimer') or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def on_alarm(signum, frame):
+        raise ExtractTimeout()
+
+    previous = signal.signal(signal.SIGALRM, on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _open(source):
+    # source: 文件路径(大文件转存) 或 二进制内容
+    return source if isinstance(source, str) else io.BytesIO(source)
+
+
+def _read(source):
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            return f.read()
+    return bytes(source)
+
+
+def source_size(source):
+    return os.path.getsize(source) if isinstance(source, str) else len(source)
+
+
+def sniff(source, ext):
+    """按文件头确定实际格式
+
+    返回:
+        '.pdf' / '.docx' / '.xlsx' / '.doc' / '.xls' 之一; 无法识别时返回原后缀
+    """
+    if isinstance(source, str):
+        with open(source, 'rb') as f:
+            head = f.read(8)
+    else:
+        head = bytes(source[:8])
+    if head.startswith(_MAGIC_PDF):
+        return '.pdf'
+    if head.startswith(_MAGIC_ZIP):
+        try:
+            with zipfile.ZipFile(_open(source)) as z:
+                names = set(z.namelist())
+        except zipfile.BadZipFile:
+            return ext
+        if 'xl/workbook.xml' in names:
+            return '.xlsx'
+        if 'word/document.xml' in names:
+            return '.docx'
+        return ext
+    if head.startswith(_MAGIC_OLE):
+        # OLE2容器无法仅凭文件头区分Word/Excel,沿用后缀(.docx/.xlsx 链接实际为旧格式时按旧格式处理)
+        return {'.docx': '.doc', '.xlsx': '.xls'}.get(ext, ext if ext in ('.doc', '.xls') else '.doc')
+    return ext
+
+
+# -- PDF --
+
+def pdf_pdfium(source, out, start=0, stop=None):
+    # pypdfium2(PDFium, C++): 直接读取文本层,无版面分析
+    import pypdfium2 as pdfium
+    with _PDFIUM_LOCK:
+        pdf = pdfium.PdfDocument(source if isinstance(source, str) else bytes(source))
+        try:
+            stop = len(pdf) if stop is None else min(stop, len(pdf))
+            for i in range(start, stop):
+                page = pdf[i]
+                textpage = page.get_textpage()
+                try:
+                    text = textpage.get_text_range()
+                finally:
+                    textpage.close()
+                    page.close()
+                out.add(text.replace('\r\n', '\n').replace('\r', '\n'))
+        finally:
+            pdf.close()
+
+
+def pdf_pdfplumber(source, out, start=0, stop=None):
+    # pdfplumber(纯Python, 含版面分析): 较慢,作为备用
+    import pdfplumber
+    with pdfplumber.open(_open(source)) as pdf:
+        for page in pdf.pages[start:stop]:
+            out.add(page.extract_text())
+
+
+PDF_BACKENDS = {
+    'pdfium': pdf_pdfium,
+    'pdfplumber': pdf_pdfplumber,
+}
+
+
+def pdf_page_count(source):
+    # 页数(用于决定是否按页分段并行); 无可用后端或文件损坏时返回None
+    # 由抓取线程在主进程中调用,pdfium调用需持有 _PDFIUM_LOCK
+    try:
+        import pypdfium2 as pdfium
+        with _PDFIUM_LOCK:
+            pdf = pdfium.PdfDocument(source if isinstance(source, str) else bytes(source))
+            try:
+                return len(pdf)
+            finally:
+                pdf.close()
+    except Exception:
+        pass
+    try:
+        import pdfplumber
+        with pdfplumber.open(_open(source)) as pdf:
+            return len(pdf.pages)
+    except Exception:
+        return None
+
+
+def page_ranges(n_pages, max_pages, per_task):
+    # 将前 max_pages 页划分为每段 per_task 页的区间 [(起始页, 结束页)]
+    n = min(n_pages, max_pages) if max_pages else n_pages
+    return [(i, min(i + per_task, n)) for i in range(0, n, per_task)]
+
+
+# -- Office --
+
+def docx_text(source, out):
+    # python-docx: 正文段落 + 表格单元格(通知类文件常以表格排版)
+    from docx import Document
+    doc = Document(_open(source))
+    for p in doc.paragraphs:
+        out.add(p.text)
+    for table in doc.tables:
+        for row in table.rows:
+            out.add("\t".join(cell.text for cell in row.cells))
+
+
+def _local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def xlsx_text(source, out):
+    # 直接解析OOXML(无需openpyxl): 共享字符串表 + 各工作表的字符串单元格,按行输出
+    with zipfile.ZipFile(_open(source)) as z:
+        names = set(z.namelist())
+        shared = []
+        if 'xl/sharedStrings.xml' in names:
+            with z.open('xl/sharedStrings.xml') as f:
+                for _, el in ElementTree.iterparse(f):
+                    if el.tag == _SHEET_NS + 'si':
+                        shared.append("".join(t.text or '' for t in el.iter(_SHEET_NS + 't')))
+                        el.clear()
+
+        # 工作表顺序与名称来自 workbook.xml,路径来自其关系文件
+        targets = {}
+        rels = 'xl/_rels/workbook.xml.rels'
+        if rels in names:
+            for rel in ElementTree.fromstring(z.read(rels)):
+                target = rel.get('Target', '').lstrip('/')
+                targets[rel.get('Id')] = target if target.startswith('xl/') else 'xl/' + target
+        sheets = []
+        for sheet in ElementTree.fromstring(z.read('xl/workbook.xml')).iter(_SHEET_NS + 'sheet'):
+            path = targets.get(sheet.get(_REL_NS + 'id'))
+            if path in names:
+                sheets.append((sheet.get('name'), path))
+        if not sheets:
+            sheets = [(None, n) for n in sorted(names) if n.startswith('xl/worksheets/sheet')]
+
+        for name, path in sheets:
+            out.add(name)
+            with z.open(path) as f:
+                row = []
+                for _, el in ElementTree.iterparse(f):
+                    tag = _local(el.tag)
+                    if tag == 'c':
+                        kind = el.get('t')
+                        if kind == 's':
+                            v = el.find(_SHEET_NS + 'v')
+                            if v is not None and v.text and v.text.isdigit() and int(v.text) < len(shared):
+                                row.append(shared[int(v.text)])
+                        elif kind == 'inlineStr':
+                            row.append("".join(t.text or '' for t in el.iter(_SHEET_NS + 't')))
+                        elif kind == 'str':
+                            v = el.find(_SHEET_NS + 'v')
+                            if v is not None and v.text:
+                                row.append(v.text)
+                        el.clear()
+                    elif tag == 'row':
+                        out.add("\t".join(c for c in row if c))
+                        row = []
+                        el.clear()
+
+
+def xls_text(source, out):
+    # 旧版Excel: 安装了xlrd时逐单元格读取,否则按OLE文本片段扫描
+    try:
+        import xlrd
+    except ImportError:
+        return ole_text(source, out)
+    book = xlrd.open_workbook(file_contents=_read(source), on_demand=True)
+    for sheet in book.sheets():
+        out.add(sheet.name)
+        for r in range(sheet.nrows):
+            out.add("\t".join(str(v) for v in sheet.row_values(r) if isinstance(v, str) and v))
+
+
+def ole_text(source, out):
+    """OLE2文档(.doc/.xls)的文本片段扫描
+
+    说明:
+        - 中文Word/Excel正文以UTF-16LE存储,按两种字节对齐解码后提取文本片段即可得到可检索的文本
+        - 错位解码或二进制数据产生的"汉字"多为生僻字: 片段中的汉字须基本属于GB2312常用字
+        - 结果可能夹带样式名等少量噪声
+    """
+    data = _read(source)
+    seen = set()
+    for offset in (0, 1):
+        chunk = data[offset:]
+        for m in _TEXT_RUN_RE.finditer(chunk[:len(chunk) // 2 * 2].decode('utf-16-le', errors='ignore')):
+            text = m.group().strip()
+            if text in seen or not _plausible(text):
+                continue
+            seen.add(text)
+            out.add(text)
+
+
+def _plausible(text):
+    cjk = _CJK_RE.findall(text)
+    if not cjk:
+        # 纯ASCII片段: 要求较长且含字母单词
+        return len(text) >= 8 and sum(c.isalpha() for c in text) >= len(text) // 2
+    common = 0
+    for c in cjk:
+        try:
+            c.encode('gb2312')
+            common += 1
+        except UnicodeEncodeError:
+            pass
+    return common >= 0.9 * len(cjk)
+
+
+EXTRACTORS = {
+    '.docx': docx_text,
+    '.xlsx': xlsx_text,
+    '.xls': xls_text,
+    '.doc': ole_text,
+}
+
+
+def extract_text(source, ext, budgets=None, max_chars=None, pdf_backend='pdfium', pages=None):
+    """抽取文档正文
+
+    参数:
+        source: 二进制内容或本地文件路径
+        ext: 链接推断的后缀(按文件头纠正)
+        budgets: {后缀: (最大字节数, 最长秒数)},缺省为 DEFAULT_BUDGETS
+        max_chars: 正文字符上限(达到后停止抽取)
+        pdf_backend: 'pdfium' | 'pdfplumber'; 首选后端不可用或失败时改用另一个
+        pages: PDF页区间 (起始页, 结束页),用于按页分段并行; None为全部页
+    返回:
+        (正文, 信息{'format', 'backend', 'truncated': None|'size'|'time'|'chars'})
+    """
+    fmt = sniff(source, ext)
+    info = {'format': fmt, 'backend': None, 'truncated': None}
+    max_bytes, seconds = (budgets or DEFAULT_BUDGETS).get(fmt, (None, None))
+    if max_bytes and source_size(source) > max_bytes:
+        info['truncated'] = 'size'
+        return "", info
+
+    if fmt == '.pdf':
+        order = [pdf_backend] + [b for b in PDF_BACKENDS if b != pdf_backend]
+        candidates = [(b, PDF_BACKENDS[b]) for b in order]
+    elif fmt in EXTRACTORS:
+        candidates = [(fmt.lstrip('.'), EXTRACTORS[fmt])]
+    else:
+        return "", info
+
+    start, stop = pages or (0, None)
+    out = None
+    for name, func in candidates:
+        out = _Collector(max_chars, time.monotonic() + seconds if seconds else None)
+        info['backend'] = name
+        try:
+            with time_limit(seconds):
+                if fmt == '.pdf':
+                    func(source, out, start, stop)
+                else:
+                    func(source, out)
+            break
+        except _Full:
+            break
+        except ExtractTimeout:
+            out.truncated = 'time'
+            break
+        except ImportError:
+            continue
+        except Exception:
+            # 文件损坏或后端不支持: 换下一个后端; 已抽取部分仍可用时直接返回
+            if out.parts:
+                break
+            continue
+    info['truncated'] = out.truncated if out else None
+    return (out.text() if out else ""), info
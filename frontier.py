@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+import time
+
+logger = logging.getLogger("USTC_Crawler")
+
+
+def url_digest(url):
+    # 16字节原始MD5摘要(十六进制字符串需32字节且对象开销更大)
+    return hashlib.md5(url.encode()).digest()
+
+
+# Digest set
+# 精确去重: 存储16字节原始摘要
+class DigestSet:
+    kind = 'digest'
+
+    def __init__(self):
+        self._items = set()
+
+    def __contains__(self, digest):
+        return digest in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def add(self, digest):
+        self._items.add(digest)
+
+    def to_bytes(self):
+        return b"".join(self._items)
+
+    def load_bytes(self, data):
+        self._items = {data[i:i + 16] for i in range(0, len(data), 16)}
+
+    def params(self):
+        return {}
+
+
+# Bloom filter
+# 近似去重: 固定内存,误判率可配置(误判仅导致极少量URL被跳过,不会重复抓取)
+# 位置计算: 双重哈希 h1 + i*h2,h1/h2 取自MD5摘要前后8字节
+class BloomFilter:
+    kind = 'bloom'
+
+    def __init__(self, capacity=1_000_000, error_rate=0.001):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, digest):
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:16], 'big') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def __contains__(self, digest):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(digest))
+
+    def __len__(self):
+        return self.count
+
+    def add(self, digest):
+        for p in self._positions(digest):
+            self.bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    def to_bytes(self):
+        return bytes(self.bits)
+
+    def load_bytes(self, data):
+        self.bits = bytearray(data)
+
+    def params(self):
+        return {'capacity': self.capacity, 'error_rate': self.error_rate, 'count': self.count}
+
+
+# Crawl frontier
+# 职责: 入队去重("已见"集合) + 内存队列溢出到磁盘 + 定期检查点(中断后可续爬)
+# 说明:
+#   - 内存队列即HostScheduler(按主机礼貌调度),超过 max_memory_urls 的普通链接追加到磁盘溢出文件
+#   - 调度器队列不足一半时从溢出文件按FIFO顺序回填
+#   - 检查点包含: 已见集合、待抓取+在途URL、溢出文件读取位置
+#   - admit: 新URL入队前的配额检查(如 UrlFilter.admit),被拒的URL同样记为已见,不再重复检查
+#   - on_saved: 规范化改写后的URL判定为重复时回调(如 UrlFilter.credit),统计改写规则节省的抓取
+#   - key: 去重键函数(如 UrlFilter.dedup_key),默认为URL本身; 更换后旧检查点的已见集合不再匹配
+#   - max_retries: 服务器要求稍后重试(429/503/5xx)的URL最多放回队列的次数
+class Frontier:
+    def __init__(self, scheduler, state_dir, seen_mode='digest', bloom_capacity=1_000_000,
+                 bloom_error_rate=0.001, max_memory_urls=50000, checkpoint_interval=60.0,
+                 admit=None, on_saved=None, key=None, max_retries=3):
+        self.scheduler = scheduler
+        self.state_dir = state_dir
+        self.seen_mode = seen_mode
+        self.bloom_capacity = bloom_capacity
+        self.bloom_error_rate = bloom_error_rate
+        self.max_memory_urls = max_memory_urls
+        self.checkpoint_interval = checkpoint_interval
+        self.admit = admit
+        self.on_saved = on_saved
+        self.key = key
+        self.max_retries = max_retries
+
+        self.seen = self._new_seen()
+        self._inflight = set()
+        self._retries = {}      # URL -> 已重试次数(仅等待重试的URL,成功或放弃后删除)
+        self._lock = threading.Lock()
+        self._last_checkpoint = time.monotonic()
+        self.skipped = 0        # 入队时因已见而跳过的URL数
+
+        os.makedirs(state_dir, exist_ok=True)
+        self._overflow_path = os.path.join(state_dir, 'overflow.txt')
+        self._overflow_offset = 0
+        self._overflow_size = 0
+        self._overflow_count = 0    # 溢出文件中尚未回填的URL数
+
+    def _new_seen(self):
+        if self.seen_mode == 'bloom':
+            return BloomFilter(self.bloom_capacity, self.bloom_error_rate)
+        return DigestSet()
+
+    def __len__(self):
+        return len(self.scheduler) + self._overflow_count
+
+    def add(self, url, front=False):
+        """URL入队(已见过或未通过配额检查则忽略)
+
+        返回:
+            是否新入队
+        """
+        return self.add_many([(url, front, None)]) == 1
+
+    def add_many(self, links):
+        """批量入队(一个页面的全部链接只加锁一次)
+
+        参数:
+            links: [(url, front, rewrite)], rewrite 为 None 或 (改写前URL, 改写规则)
+        返回:
+            新入队的URL数
+        说明:
+            - 改写前写法的摘要同样记入已见集合(不另行存储,bloom模式下内存仍固定):
+              改写后的URL已见过且该写法首次出现时,才计入改写规则节省的抓取
+            - 已见集合中的去重键不含协议(见 UrlFilter.dedup_key),原始写法摘要按完整URL计算,两者不会冲突
+        """
+        key = self.key
+        track = self.on_saved is not None
+        digests = [(url_digest(key(url) if key else url), url, front,
+                    url_digest(rewrite[0]) if rewrite and track else None, rewrite)
+                   for url, front, rewrite in links]
+        added = 0
+        overflow = []
+        credited = []
+        with self._lock:
+            for digest, url, front, raw_digest, rewrite in digests:
+                if digest in self.seen:
+                    self.skipped += 1
+                    if raw_digest is not None and raw_digest not in self.seen:
+                        self.seen.add(raw_digest)
+                        credited.extend(rewrite[1])
+                    continue
+                self.seen.add(digest)
+                if raw_digest is not None:
+                    self.seen.add(raw_digest)
+                if self.admit and not self.admit(url, front):
+                    continue
+                added += 1
+                # 文档链接(front)始终进入内存队头; 普通链接超出内存上限时溢出到磁盘
+                if front or len(self.scheduler) < self.max_memory_urls:
+                    self.scheduler.push(url, front)
+                else:
+                    overflow.append(url)
+            if overflow:
+                with open(self._overflow_path, 'a', encoding='utf-8') as f:
+                    f.write("\n".join(overflow) + "\n")
+                    self._overflow_size = f.tell()
+                self._overflow_count += len(overflow)
+        if credited:
+            self.on_saved(credited)
+        return added
+
+    def _refill(self):
+        # 从溢出文件回填到调度器(需持有self._lock)
+        if self._overflow_offset >= self._overflow_size:
+            return
+        if len(self.scheduler) >= self.max_memory_urls // 2:
+            return
+        with open(self._overflow_path, 'r', encoding='utf-8') as f:
+            f.seek(self._overflow_offset)
+            while len(self.scheduler) < self.max_memory_urls:
+                line = f.readline()
+                if not line:
+                    break
+                if line.strip():
+                    self.scheduler.push(line.strip())
+                    self._overflow_count -= 1
+            self._overflow_offset = f.tell()
+
+    def pop(self):
+        url = self.scheduler.pop()
+        if url is not None:
+            with self._lock:
+                self._inflight.add(url)
+        return url
+
+    def done(self, url, delay=None, retry=False):
+        """标记URL处理完成
+
+        参数:
+            retry: 服务器要求稍后重试(429/503/5xx): 未超过 max_retries 次时放回该主机队尾,
+                   下次抓取时间由限速器给出(含 Retry-After 冷却)
+        返回:
+            是否放回队列重试
+        说明:
+            - 先回填/放回再释放主机,保证调度器不会在仍有待抓取URL时判定任务结束
+        """
+        with self._lock:
+            self._inflight.discard(url)
+            attempts = self._retries.pop(url, 0)
+            requeued = retry and attempts < self.max_retries
+            if requeued:
+                self._retries[url] = attempts + 1
+            self._refill()
+        if requeued:
+            self.scheduler.push(url)
+        self.scheduler.done(url, delay)
+        if time.monotonic() - self._last_checkpoint >= self.checkpoint_interval:
+            self.checkpoint()
+        return requeued
+
+    def requeue(self, url):
+        # 已取出但未抓取的URL放回队头(如达到页数上限时),保证检查点不丢失
+        with self._lock:
+            self._inflight.discard(url)
+        self.scheduler.push(url, front=True)
+        self.scheduler.done(url, 0)
+
+    def _write_atomic(self, name, data, mode='wb'):
+        path = os.path.join(self.state_dir, name)
+        tmp = path + '.tmp'
+        with open(tmp, mode, **({} if 'b' in mode else {'encoding': 'utf-8'})) as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def checkpoint(self):
+        # 写入检查点(临时文件+原子改名),在途URL一并保存以免中断时丢失
+        with self._lock:
+            self._last_checkpoint = time.monotonic()
+            # 溢出文件已读完则截断(仅在检查点时进行,保证与已保存的读取位置一致)
+            if self._overflow_size and self._overflow_offset >= self._overflow_size:
+                open(self._overflow_path, 'w').close()
+                self._overflow_offset = self._overflow_size = 0
+            pending = list(self._inflight) + self.scheduler.snapshot()
+            self._write_atomic('seen.bin', self.seen.to_bytes())
+            self._write_atomic('queue.txt', "\n".join(pending), mode='w')
+            self._write_atomic('state.json', json.dumps({
+                'seen_mode': self.seen.kind,
+                'seen_params': self.seen.params(),
+                'overflow_offset': self._overflow_offset,
+                'overflow_size': self._overflow_size,
+                'overflow_count': self._overflow_count,
+                'saved_at': time.strftime("%Y-%m-%d %H:%M:%S"),
+            }), mode='w')
+        logger.info(f"Checkpoint saved: {len(pending)} queued | {len(self.seen)} seen")
+
+    def restore(self):
+        """从检查点恢复
+
+        返回:
+            是否成功恢复(无检查点时返回False,由调用方从种子开始)
+        """
+        state_path = os.path.join(self.state_dir, 'state.json')
+        if not os.path.exists(state_path):
+            return False
+        with open(state_path, encoding='utf-8') as f:
+            state = json.load(f)
+        with self._lock:
+            if state['seen_mode'] == 'bloom':
+                params = state['seen_params']
+                self.seen = BloomFilter(params['capacity'], params['error_rate'])
+                self.seen.count = params.get('count', 0)
+            else:
+                self.seen = DigestSet()
+            with open(os.path.join(self.state_dir, 'seen.bin'), 'rb') as f:
+                self.seen.load_bytes(f.read())
+            self._overflow_offset = state['overflow_offset']
+            self._overflow_size = state['overflow_size']
+            self._overflow_count = state.get('overflow_count', 0)
+            # 丢弃检查点之后追加的溢出记录(对应URL不在已保存的已见集合中,会被重新发现)
+            if os.path.exists(self._overflow_path):
+                os.truncate(self._overflow_path, self._overflow_size)
+            with open(os.path.join(self.state_dir, 'queue.txt'), encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        self.scheduler.push(line.strip())
+            self._refill()
+        logger.info(f"Resumed from checkpoint ({state['saved_at']}): {len(self.scheduler)} queued | {len(self.seen)} seen")
+        return True
+
+    def clear(self):
+        # 任务完成后删除检查点,下次运行从种子重新开始
+        for name in ('seen.bin', 'queue.txt', 'state.json', 'overflow.txt'):
+            path = os.path.join(self.state_dir, name)
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+import base64
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger("USTC_Crawler")
+
+
+def _b(value):
+    return value if isinstance(value, bytes) else str(value).encode('utf-8')
+
+
+# Batch writer
+# 职责: 缓冲HBase Put并通过 table.batch 批量提交,减少Thrift往返
+# 可靠性: 失败按指数退避重连重试; 仍失败则写入本地日志文件(journal),下次启动时回放
+# 刷新时机: 缓冲达到 batch_size / 距上次刷新超过 flush_interval / close()
+# 写入回调: on_flush 在每批行成功写入后调用(刷新线程中执行),用于依赖已落库数据的后续处理
+class BatchWriter:
+    def __init__(self, conn_factory, table_name, batch_size=100, flush_interval=5.0,
+                 max_buffer=1000, journal_path=None, max_retries=3, backoff=1.0, on_flush=None):
+        """
+        参数:
+            conn_factory: 无参函数,返回已打开的happybase连接(重连时再次调用)
+            max_buffer: 缓冲上限,写满时 put 阻塞等待刷新(背压,内存有界)
+            journal_path: 失败行的落盘文件(JSON Lines),None为不落盘
+            on_flush: 回调 on_flush(rows),rows 为刚成功写入的 [(行键, {列: 值})]; 落盘的行不回调
+        """
+        self.conn_factory = conn_factory
+        self.table_name = table_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max(max_buffer, batch_size)
+        self.journal_path = journal_path
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.on_flush = on_flush
+
+        self.written = 0          # 成功写入行数
+        self.journaled = 0        # 落盘行数
+
+        self._buffer = []
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()  # 同一时刻只有一个刷新(连接非线程安全)
+        self._closed = False
+        self.conn = conn_factory()
+
+        self.replay_journal()
+        self._thread = threading.Thread(target=self._flush_loop, name="hbase-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, row_key, data):
+        # 写入缓冲区; 缓冲区已满时阻塞直到后台刷新腾出空间
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("BatchWriter is closed")
+            while len(self._buffer) >= self.max_buffer:
+                self._cond.wait()
+            self._buffer.append((_b(row_key), {_b(k): _b(v) for k, v in data.items()}))
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify_all()
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_interval
+                while not self._closed and len(self._buffer) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._closed:
+                    return
+            self.flush()
+
+    def flush(self):
+        # 取出当前缓冲区全部内容并提交
+        with self._flush_lock:
+            with self._cond:
+                rows, self._buffer = self._buffer, []
+                self._cond.notify_all()
+            if rows:
+                self._write_with_retry(rows)
+
+    def _send(self, rows):
+        table = self.conn.table(self.table_name)
+        with table.batch(batch_size=self.batch_size) as batch:
+            for row_key, data in rows:
+                batch.put(row_key, data)
+
+    def _write_with_retry(self, rows):
+        # 指数退避重试(每次重试前重建连接); 全部失败则落盘,绝不静默丢弃
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._send(rows)
+                self.written += len(rows)
+                break
+            except Exception as e:
+                logger.warning(f"HBase batch write failed ({len(rows)} rows, attempt {attempt + 1}): {e}")
+                if attempt == self.max_retries:
+                    self._journal(rows)
+                    return False
+                time.sleep(self.backoff * (2 ** attempt))
+                self._reconnect()
+        if self.on_flush:
+            try:
+                self.on_flush(rows)
+            except Exception as e:
+                logger.warning(f"on_flush callback failed for {len(rows)} rows: {e}")
+        return True
+
+    def _reconnect(self):
+        try:
+            self.conn.close()
+        except Exception:
+            pass
+        try:
+            self.conn = self.conn_factory()
+        except Exception as e:
+            logger.warning(f"HBase reconnect failed: {e}")
+
+    def _journal(self, rows):
+        if not self.journal_path:
+            logger.error(f"HBase write failed, {len(rows)} rows dropped (journal disabled)")
+            return
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            for row_key, data in rows:
+                f.write(json.dumps({
+                    'row': base64.b64encode(row_key).decode(),
+                    'data': {base64.b64encode(k).decode(): base64.b64encode(v).decode() for k, v in data.items()},
+                }) + "\n")
+        self.journaled += len(rows)
+        logger.error(f"HBase write failed, {len(rows)} rows spilled to journal {self.journal_path}")
+
+    def replay_journal(self):
+        """回放上次运行落盘的失败行
+
+        说明:
+            - 回放前先将日志改名为唯一的 .replay.<时间戳> 文件,回放失败的行重新写入新日志
+            - 回放中途退出遗留的 .replay* 文件在下次启动时按改名顺序一并回放(Put幂等,重复写入无副作用)
+        """
+        if not self.journal_path:
+            return 0
+        if os.path.exists(self.journal_path):
+            os.replace(self.journal_path, f"{self.journal_path}.replay.{time.time_ns()}")
+        total = 0
+        for replay_path in sorted(glob.glob(glob.escape(self.journal_path) + ".replay*")):
+            rows = []
+            with open(replay_path, encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        # 落盘时中断留下的不完整行
+                        logger.warning(f"Skipping malformed journal line in {replay_path}")
+                        continue
+                    rows.append((base64.b64decode(rec['row']),
+                                 {base64.b64decode(k): base64.b64decode(v) for k, v in rec['data'].items()}))
+            for i in range(0, len(rows), self.batch_size):
+                self._write_with_retry(rows[i:i + self.batch_size])
+            os.remove(replay_path)
+            total += len(rows)
+            logger.info(f"Replayed {len(rows)} journaled rows from {replay_path}")
+        return total
+
+    def close(self):
+        # 停止后台线程并保证缓冲区全部刷新
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        self.flush()
+        try:
+            self.conn.close()
+        except Exception:
+            pass
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+import os
+import subprocess
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class HDFSError(Exception):
+    # HDFS读写失败(网络错误、路径不存在、进程异常等)
+    pass
+
+
+# HDFS backend interface
+# 职责: 屏蔽底层访问方式(WebHDFS / hdfs命令行 / 本地目录),爬虫与Web应用共用
+# 约定: put 对已存在文件视为成功(文件名为内容MD5,天然去重)
+class HDFSBackend:
+    def put(self, hdfs_path, data):
+        """写入文件
+
+        参数:
+            hdfs_path: HDFS绝对路径
+            data: 文件二进制内容(bytes或memoryview等缓冲区对象,实现不应复制)
+        异常:
+            HDFSError: 写入失败
+        """
+        raise NotImplementedError
+
+    def iter_read(self, hdfs_path, chunk_size=65536, offset=0, length=None):
+        """分块读取文件内容(生成器)
+
+        参数:
+            offset: 起始字节偏移
+            length: 读取字节数(None为读到文件末尾)
+        """
+        raise NotImplementedError
+
+    def size(self, hdfs_path):
+        # 文件字节数
+        raise NotImplementedError
+
+    def read(self, hdfs_path):
+        # 一次性读取完整文件
+        return b"".join(self.iter_read(hdfs_path))
+
+    def close(self):
+        pass
+
+
+# WebHDFS backend
+# 通过NameNode REST接口读写,底层requests会话保持keep-alive连接池
+# 避免每个文件启动一次JVM(hdfs dfs命令约1~3秒)
+class WebHDFSBackend(HDFSBackend):
+    def __init__(self, url, user=None, pool_size=16, timeout=30):
+        from hdfs import InsecureClient
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.client = InsecureClient(url, user=user, session=self.session, timeout=timeout)
+
+    def put(self, hdfs_path, data):
+        from hdfs import HdfsError
+        try:
+            self.client.write(hdfs_path, data=data, overwrite=False)
+        except HdfsError as e:
+            # 文件已存在时仍视为成功(满足去重需求)
+            if "already exists" in str(e) or "FileAlreadyExists" in str(e):
+                return
+            raise HDFSError(str(e)) from e
+        except requests.RequestException as e:
+            raise HDFSError(str(e)) from e
+
+    def iter_read(self, hdfs_path, chunk_size=65536, offset=0, length=None):
+        from hdfs import HdfsError
+        try:
+            # offset/length 由NameNode/DataNode端处理,只传输所需字节
+            with self.client.read(hdfs_path, offset=offset, length=length, chunk_size=chunk_size) as reader:
+                for chunk in reader:
+                    yield chunk
+        except (HdfsError, requests.RequestException) as e:
+            raise HDFSError(str(e)) from e
+
+    def size(self, hdfs_path):
+        from hdfs import HdfsError
+        try:
+            return self.client.status(hdfs_path)['length']
+        except (HdfsError, requests.RequestException) as e:
+            raise HDFSError(str(e)) from e
+
+    def close(self):
+        self.session.close()
+
+
+# Subprocess backend
+# 原有方式: 通过WSL调用 hdfs dfs -put/-cat (标准输入/输出管道,避免临时文件)
+class SubprocessBackend(HDFSBackend):
+    def __init__(self, hdfs_bin, prefix="wsl"):
+        self.cmd = f"{prefix} {hdfs_bin}".strip()
+
+    def put(self, hdfs_path, data):
+        cmd_str = f'{self.cmd} dfs -put -f - "{hdfs_path}"'
+        try:
+            process = subprocess.Popen(
+                cmd_str,
+                shell=True,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE
+            )
+            _, stderr = process.communicate(input=data)
+        except OSError as e:
+            raise HDFSError(str(e)) from e
+
+        if process.returncode != 0:
+            err_msg = stderr.decode('utf-8', errors='ignore').strip()
+            if "File exists" not in err_msg:
+                raise HDFSError(err_msg)
+
+    def iter_read(self, hdfs_path, chunk_size=65536, offset=0, length=None):
+        # -cat 不支持偏移读取: 跳过offset之前的字节,读满length后提前结束进程
+        cmd = f'{self.cmd} dfs -cat "{hdfs_path}"'
+        try:
+            process = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except OSError as e:
+            raise HDFSError(str(e)) from e
+        try:
+            skip = offset
+            remaining = length
+            while remaining is None or remaining > 0:
+                chunk = process.stdout.read(chunk_size)
+                if not chunk:
+                    break
+                if skip:
+                    if len(chunk) <= skip:
+                        skip -= len(chunk)
+                        continue
+                    chunk = chunk[skip:]
+                    skip = 0
+                if remaining is not None:
+                    chunk = chunk[:remaining]
+                    remaining -= len(chunk)
+                yield chunk
+            if remaining is None or remaining > 0:
+                process.wait()
+                if process.returncode != 0:
+                    raise HDFSError(process.stderr.read().decode('utf-8', errors='ignore').strip())
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.stdout.close()
+            process.stderr.close()
+
+    def size(self, hdfs_path):
+        cmd = f'{self.cmd} dfs -stat %b "{hdfs_path}"'
+        try:
+            out = subprocess.run(cmd, shell=True, capture_output=True)
+        except OSError as e:
+            raise HDFSError(str(e)) from e
+        if out.returncode != 0:
+            raise HDFSError(out.stderr.decode('utf-8', errors='ignore').strip())
+        return int(out.stdout.strip())
+
+
+# Local filesystem backend
+# 将HDFS路径映射到本地目录,用于无集群环境下的开发与测试
+class LocalBackend(HDFSBackend):
+    def __init__(self, root):
+        self.root = root
+
+    def _local_path(self, hdfs_path):
+        return os.path.join(self.root, hdfs_path.lstrip('/'))
+
+    def put(self, hdfs_path, data):
+        path = self._local_path(hdfs_path)
+        if os.path.exists(path):
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 先写临时文件再原子改名,避免并发写入产生半截文件
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            raise HDFSError(str(e)) from e
+
+    def iter_read(self, hdfs_path, chunk_size=65536, offset=0, length=None):
+        try:
+            f = open(self._local_path(hdfs_path), 'rb')
+        except OSError as e:
+            raise HDFSError(str(e)) from e
+        with f:
+            f.seek(offset)
+            remaining = length
+            while remaining is None or remaining > 0:
+                chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    def size(self, hdfs_path):
+        try:
+            return os.path.getsize(self._local_path(hdfs_path))
+        except OSError as e:
+            raise HDFSError(str(e)) from e
+
+
+# Fallback backend
+# 主后端出错时改用备用后端(如WebHDFS不可达时退回hdfs命令行)
+class FallbackBackend(HDFSBackend):
+    def __init__(self, primary, secondary):
+        self.primary = primary
+        self.secondary = secondary
+
+    def put(self, hdfs_path, data):
+        try:
+            self.primary.put(hdfs_path, data)
+        except HDFSError:
+            self.secondary.put(hdfs_path, data)
+
+    def iter_read(self, hdfs_path, chunk_size=65536, offset=0, length=None):
+        # 仅在尚未输出任何数据前切换后端,避免内容重复
+        started = False
+        try:
+            for chunk in self.primary.iter_read(hdfs_path, chunk_size, offset, length):
+                started = True
+                yield chunk
+        except HDFSError:
+            if started:
+                raise
+            yield from self.secondary.iter_read(hdfs_path, chunk_size, offset, length)
+
+    def size(self, hdfs_path):
+        try:
+            return self.primary.size(hdfs_path)
+        except HDFSError:
+            return self.secondary.size(hdfs_path)
+
+    def close(self):
+        self.primary.close()
+        self.secondary.close()
+
+
+def create_backend(kind, web_url=None, user=None, hdfs_bin=None, local_root=None,
+                   fallback=None, pool_size=16):
+    """按配置创建HDFS后端
+
+    参数:
+        kind: 'webhdfs' | 'subprocess' | 'local'
+        fallback: 备用后端类型(同上),为None时不启用
+    """
+    def build(k):
+        if k == 'webhdfs':
+            return WebHDFSBackend(web_url, user=user, pool_size=pool_size)
+        if k == 'subprocess':
+            return SubprocessBackend(hdfs_bin)
+        if k == 'local':
+            return LocalBackend(local_root)
+        raise ValueError(f"Unknown HDFS backend: {k}")
+
+    backend = build(kind)
+    if fallback and fallback != kind:
+        backend = FallbackBackend(backend, build(fallback))
+    return backend
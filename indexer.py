@@ -0,0 +1,385 @@
+# -*- coding: utf-8 -*-
+import logging
+import math
+import os
+import re
+import struct
+import sys
+import time
+from collections import defaultdict
+
+import happybase
+import jieba
+
+import metrics
+
+# Configuration
+class IndexConfig:
+    # HBase连接参数(与爬虫/Web应用保持一致)
+    HBASE_HOST = '172.20.194.143'
+    HBASE_PORT = 9090
+    DATA_TABLE = 'ustc_search_engine'     # 文档元数据表
+    INDEX_TABLE = 'ustc_search_index'     # 倒排索引表(行键=词项)
+
+    # BM25参数
+    BM25_K1 = 1.2
+    BM25_B = 0.75
+
+    # 字段权重(词频按字段加权累加,近似BM25F)
+    TITLE_WEIGHT = 3
+    KEYWORDS_WEIGHT = 2
+    CONTENT_WEIGHT = 1
+
+    # 全量重建时的批量写入大小
+    BATCH_SIZE = 1000
+
+# 字段标记位(posting中记录词项出现在哪些字段)
+FIELD_TITLE = 1
+FIELD_KEYWORDS = 2
+FIELD_CONTENT = 4
+
+# posting编码: 加权词频(uint16) + 文档长度(uint32) + 字段标记(uint8)
+POSTING = struct.Struct('>HIB')
+
+# 统计行: 文档总数与总长度(HBase原子计数器),'!'不会出现在词项中
+STATS_ROW = b'!stats'
+DOC_COUNT_COL = b's:doc_count'
+TOTAL_LEN_COL = b's:total_len'
+# 数据版本号: 每次索引变更递增,Web应用据此使查询缓存失效
+GENERATION_COL = b's:generation'
+
+# 词频统计列: 标题+正文的原始词频,写入时预计算,扫描模式据此计分而无需读取正文
+# 编码: 词项数N(uint16) + N个词频(uint16,按词频降序) + 词项UTF-8(以\x00分隔)
+# 保留全部词项(低频词正是用户常搜的词,不能截断); 5000字摘要的词项数远小于uint16上限
+TF_COLUMN = b'index:tf'
+_TF_HEADER = struct.Struct('>H')
+_TF_COUNT = struct.Struct('>H')
+
+_WORD_RE = re.compile(r'\w', re.UNICODE)
+
+# 停用词: 虚词/代词等几乎出现在所有文档中的词,不建posting也不参与检索
+# (否则含"的""和""与"的查询会匹配大部分语料); 英文部分同 jieba.analyse 的默认停用词
+STOP_WORDS = frozenset((
+    '的', '地', '得', '了', '着', '过', '和', '与', '及', '或', '而', '且', '并', '之', '其', '在', '是',
+    '为', '于', '对', '把', '被', '从', '向', '以', '将', '由', '也', '就', '都', '又', '还', '等',
+    '这', '那', '个', '些', '吗', '呢', '吧', '啊', '么', '我', '你', '他', '她', '它',
+    '以及', '或者', '并且', '而且', '但是', '因为', '所以', '如果', '关于', '对于', '我们', '你们',
+    '他们', '这个', '那个', '这些', '那些', '其中', '一个', '没有', '可以',
+    'the', 'of', 'is', 'and', 'to', 'in', 'that', 'we', 'for', 'an', 'are', 'by', 'be', 'as', 'on',
+    'with', 'can', 'if', 'from', 'which', 'you', 'it', 'this', 'then', 'at', 'have', 'all', 'not',
+    'one', 'has', 'or', 'a',
+))
+
+logger = logging.getLogger("USTC_Indexer")
+
+SEARCH_SECONDS = metrics.histogram('index_search_stage_seconds', 'BM25 search time by stage', ['stage'])
+
+
+def tokenize(text):
+    """Jieba搜索引擎模式分词
+
+    返回:
+        小写词项列表(过滤空白、纯标点与停用词); 文档与查询使用同一分词,保证词项一致
+    """
+    if not text:
+        return []
+    terms = (t.lower() for t in jieba.cut_for_search(text) if _WORD_RE.search(t))
+    return [t for t in terms if t not in STOP_WORDS]
+
+
+def encode_term_stats(counts):
+    """词频统计编码(写入 index:tf)
+
+    参数:
+        counts: {词项: 词频}
+    """
+    top = sorted(counts.items(), key=lambda x: (-x[1], x[0]))[:0xFFFF]
+    return (_TF_HEADER.pack(len(top))
+            + struct.pack(f'>{len(top)}H', *(min(c, 0xFFFF) for _, c in top))
+            + b'\x00'.join(t.replace('\x00', '').encode('utf-8') for t, _ in top))
+
+
+def term_counts(blob, terms):
+    """按需查询若干词项的词频(不解码整列)
+
+    参数:
+        blob: index:tf 列值
+        terms: 词项UTF-8字节串列表
+    返回:
+        与terms对应的词频列表(未出现为0); 列不存在时返回None
+    """
+    if not blob:
+        return None
+    n = _TF_HEADER.unpack_from(blob)[0]
+    names = blob[_TF_HEADER.size + _TF_COUNT.size * n:].split(b'\x00')
+    counts = []
+    for term in terms:
+        try:
+            i = names.index(term)
+        except ValueError:
+            counts.append(0)
+            continue
+        counts.append(_TF_COUNT.unpack_from(blob, _TF_HEADER.size + _TF_COUNT.size * i)[0])
+    return counts
+
+
+def decode_term_stats(blob):
+    # 完整解码为 {词项: 词频}(调试与离线任务使用)
+    if not blob:
+        return {}
+    n = _TF_HEADER.unpack_from(blob)[0]
+    counts = struct.unpack_from(f'>{n}H', blob, _TF_HEADER.size)
+    names = blob[_TF_HEADER.size + _TF_COUNT.size * n:].split(b'\x00') if n else []
+    return {t.decode('utf-8', 'ignore'): c for t, c in zip(names, counts)}
+
+
+# Inverted index
+# 职责: 维护 词项 -> posting列表(文档行键, 词频, 字段标记) 并提供BM25检索
+# 存储: 索引表 p 列族存放posting(列名 p:<行键>), s 列族存放全局统计
+class InvertedIndex:
+    def __init__(self, conn, data_table=IndexConfig.DATA_TABLE, index_table=IndexConfig.INDEX_TABLE):
+        self.conn = conn
+        self.data_table_name = data_table
+        self.index_table_name = index_table
+        self.data_table = conn.table(data_table)
+        self.index_table = conn.table(index_table)
+
+    def ensure_table(self):
+        # 索引表不存在时自动创建(仅保留一个版本)
+        names = [n.decode() if isinstance(n, bytes) else n for n in self.conn.tables()]
+        if self.index_table_name not in names:
+            self.conn.create_table(self.index_table_name, {
+                'p': dict(max_versions=1),
+                's': dict(max_versions=1),
+            })
+            logger.info(f"Index table created: {self.index_table_name}")
+
+    @staticmethod
+    def analyze(title, keywords, content):
+        """文档分析: 三个字段分词后按权重累加词频
+
+        参数:
+            title: 标题文本
+            keywords: 逗号分隔的关键词
+            content: 正文摘要
+        返回:
+            (postings, doc_len): postings为 {词项: [加权词频, 字段标记, 标题+正文原始词频]}
+        """
+        postings = defaultdict(lambda: [0, 0, 0])
+        doc_len = 0
+        fields = (
+            (title, IndexConfig.TITLE_WEIGHT, FIELD_TITLE),
+            (keywords.replace(',', ' ') if keywords else '', IndexConfig.KEYWORDS_WEIGHT, FIELD_KEYWORDS),
+            (content, IndexConfig.CONTENT_WEIGHT, FIELD_CONTENT),
+        )
+        for text, weight, flag in fields:
+            for term in tokenize(text):
+                entry = postings[term]
+                entry[0] += weight
+                entry[1] |= flag
+                if flag != FIELD_KEYWORDS:
+                    entry[2] += 1
+                doc_len += 1
+        return dict(postings), doc_len
+
+    @staticmethod
+    def term_stats(postings):
+        # 由analyze结果生成 index:tf 列值(仅统计标题与正文)
+        return encode_term_stats({term: e[2] for term, e in postings.items() if e[2]})
+
+    @staticmethod
+    def _encode_posting(tf, doc_len, flags):
+        return POSTING.pack(min(tf, 0xFFFF), min(doc_len, 0xFFFFFFFF), flags)
+
+    def _write_postings(self, batch, row_key, postings, doc_len):
+        col = b'p:' + row_key
+        for term, (tf, flags, _) in postings.items():
+            batch.put(term.encode('utf-8'), {col: self._encode_posting(tf, doc_len, flags)})
+
+    def add_document(self, row_key, title, keywords, content, bump=True):
+        """增量索引单个文档(数据行写入HBase后调用)
+
+        参数:
+            bump: 是否递增数据版本号; 批量索引时传False,整批完成后调用一次 bump_generation
+        说明:
+            - 旧版本词项记录在数据表 index:terms 中,用于删除过期posting
+            - 全局统计通过HBase计数器原子更新,无需全量重建
+        """
+        postings, doc_len = self.analyze(title, keywords, content)
+        self.add_analyzed(row_key, postings, doc_len, bump=bump)
+
+    def add_analyzed(self, row_key, postings, doc_len, bump=True):
+        """写入已分析文档的posting(analyze 可在其他进程中执行,如 reindex.py 的工作进程)
+
+        参数:
+            postings / doc_len: analyze 的返回值
+        """
+        if isinstance(row_key, str):
+            row_key = row_key.encode()
+        old = self.data_table.row(row_key, columns=[b'index:terms', b'index:doc_len'])
+        old_terms = set(old.get(b'index:terms', b'').decode('utf-8', 'ignore').split()) if old else set()
+        old_len = int(old.get(b'index:doc_len', b'0') or 0) if old else 0
+
+        col = b'p:' + row_key
+        with self.index_table.batch() as batch:
+            for term in old_terms - set(postings):
+                batch.delete(term.encode('utf-8'), columns=[col])
+            self._write_postings(batch, row_key, postings, doc_len)
+
+        self.data_table.put(row_key, {
+            b'index:terms': ' '.join(postings).encode('utf-8'),
+            b'index:doc_len': str(doc_len).encode(),
+            TF_COLUMN: self.term_stats(postings),
+        })
+
+        if b'index:doc_len' not in (old or {}):
+            self.index_table.counter_inc(STATS_ROW, DOC_COUNT_COL, 1)
+        if doc_len != old_len:
+            self.index_table.counter_inc(STATS_ROW, TOTAL_LEN_COL, doc_len - old_len)
+        if bump:
+            self.bump_generation()
+
+    def bump_generation(self):
+        # 递增数据版本号,Web应用据此使查询缓存失效
+        self.index_table.counter_inc(STATS_ROW, GENERATION_COL, 1)
+
+    def build(self):
+        """全量重建索引: 清空索引表后扫描数据表重新写入"""
+        names = [n.decode() if isinstance(n, bytes) else n for n in self.conn.tables()]
+        if self.index_table_name in names:
+            self.conn.delete_table(self.index_table_name, disable=True)
+        self.ensure_table()
+        self.index_table = self.conn.table(self.index_table_name)
+
+        doc_count = 0
+        total_len = 0
+        columns = [b'meta:title', b'index:keywords', b'data:content']
+        index_batch = self.index_table.batch(batch_size=IndexConfig.BATCH_SIZE)
+        data_batch = self.data_table.batch(batch_size=IndexConfig.BATCH_SIZE)
+        for key, data in self.data_table.scan(columns=columns):
+            title = data.get(b'meta:title', b'').decode('utf-8', 'ignore')
+            keywords = data.get(b'index:keywords', b'').decode('utf-8', 'ignore')
+            content = data.get(b'data:content', b'').decode('utf-8', 'ignore')
+            postings, doc_len = self.analyze(title, keywords, content)
+            self._write_postings(index_batch, key, postings, doc_len)
+            data_batch.put(key, {
+                b'index:terms': ' '.join(postings).encode('utf-8'),
+                b'index:doc_len': str(doc_len).encode(),
+                TF_COLUMN: self.term_stats(postings),
+            })
+            doc_count += 1
+            total_len += doc_len
+            if doc_count % 1000 == 0:
+                logger.info(f"Indexed {doc_count} documents...")
+        index_batch.send()
+        data_batch.send()
+
+        self.index_table.counter_set(STATS_ROW, DOC_COUNT_COL, doc_count)
+        self.index_table.counter_set(STATS_ROW, TOTAL_LEN_COL, total_len)
+        # 重建后索引表为新表,版本号从随机起点开始,避免与旧值相同导致缓存不失效
+        self.index_table.counter_set(STATS_ROW, GENERATION_COL, int.from_bytes(os.urandom(4), 'big'))
+        logger.info(f"Index build finished. Documents: {doc_count}, avg length: {total_len / max(doc_count, 1):.1f}")
+        return doc_count
+
+    def backfill_term_stats(self, row_start=None, row_stop=None, only_missing=True):
+        """为此前写入的文档补写 index:tf 列(不改动倒排索引)
+
+        参数:
+            row_start/row_stop: 行键范围(中断后从日志中的最后行键继续)
+            only_missing: 仅处理尚无 index:tf 的行
+        返回:
+            补写的行数
+        """
+        columns = [b'meta:title', b'data:content', TF_COLUMN]
+        done = 0
+        last_key = None
+        with self.data_table.batch(batch_size=IndexConfig.BATCH_SIZE) as batch:
+            for key, data in self.data_table.scan(row_start=row_start, row_stop=row_stop, columns=columns):
+                last_key = key
+                if only_missing and data.get(TF_COLUMN):
+                    continue
+                title = data.get(b'meta:title', b'').decode('utf-8', 'ignore')
+                content = data.get(b'data:content', b'').decode('utf-8', 'ignore')
+                postings, _ = self.analyze(title, '', content)
+                batch.put(key, {TF_COLUMN: self.term_stats(postings)})
+                done += 1
+                if done % 1000 == 0:
+                    logger.info(f"Backfilled {done} rows (last row key: {key.decode()})")
+        logger.info(f"Term stats backfill finished. Rows: {done}, last row key: {last_key.decode() if last_key else '-'}")
+        return done
+
+    def generation(self):
+        # 当前数据版本号(尚未写入过时为0)
+        return self.index_table.counter_get(STATS_ROW, GENERATION_COL)
+
+    def search(self, query):
+        """BM25检索
+
+        参数:
+            query: 原始查询串
+        返回:
+            [(行键, 得分)] 按得分降序; 查询词全部未登录时返回空列表
+        说明:
+            - 只返回包含全部查询词项(停用词已去除)的文档,与扫描模式的命中条件一致
+        """
+        start = time.perf_counter()
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        SEARCH_SECONDS.labels('tokenize').observe(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        doc_count = self.index_table.counter_get(STATS_ROW, DOC_COUNT_COL)
+        total_len = self.index_table.counter_get(STATS_ROW, TOTAL_LEN_COL)
+        if doc_count <= 0:
+            return []
+        avgdl = total_len / doc_count if total_len > 0 else 1.0
+        k1, b = IndexConfig.BM25_K1, IndexConfig.BM25_B
+
+        scores = defaultdict(float)
+        matched = defaultdict(int)  # 行键 -> 命中的查询词项数
+        # 一次RPC批量取回所有词项的posting列表
+        rows = self.index_table.rows([t.encode('utf-8') for t in terms], columns=[b'p'])
+        SEARCH_SECONDS.labels('index_read').observe(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for term, row in rows:
+            df = len(row)
+            idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+            for col, value in row.items():
+                tf, dl, _flags = POSTING.unpack(value)
+                norm = tf + k1 * (1 - b + b * dl / avgdl)
+                scores[col[2:]] += idf * tf * (k1 + 1) / norm
+                matched[col[2:]] += 1
+
+        ranked = sorted(((key, score) for key, score in scores.items() if matched[key] == len(terms)),
+                        key=lambda x: x[1], reverse=True)
+        SEARCH_SECONDS.labels('score').observe(time.perf_counter() - start)
+        return ranked
+
+
+# Entry point
+# 用法: python indexer.py build                        (全量重建倒排索引)
+#       python indexer.py backfill-tf [起始行键] [结束行键]  (为旧数据补写 index:tf 列)
+if __name__ == '__main__':
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s] %(message)s', datefmt='%H:%M:%S'))
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+
+    if len(sys.argv) < 2 or sys.argv[1] not in ('build', 'backfill-tf'):
+        print("Usage: python indexer.py build | backfill-tf [--all] [row_start] [row_stop]")
+        sys.exit(1)
+
+    conn = happybase.Connection(IndexConfig.HBASE_HOST, port=IndexConfig.HBASE_PORT, timeout=30000)
+    conn.open()
+    try:
+        if sys.argv[1] == 'build':
+            InvertedIndex(conn).build()
+        else:
+            # --all: 重写已有的 index:tf(如早期按词频截断写入的行)
+            args = [a for a in sys.argv[2:] if a != '--all']
+            bounds = [a.encode() for a in args[:2]] + [None, None]
+            InvertedIndex(conn).backfill_term_stats(bounds[0], bounds[1], only_missing='--all' not in sys.argv)
+    finally:
+        conn.close()
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import mmap
+import os
+import tempfile
+
+
+# Spooled download
+# 职责: 流式接收文件内容,边接收边计算MD5,避免 bytes 拼接带来的二次方复制
+# 存储: 未超过 spool_threshold 时写入预分配的 bytearray(容量按需倍增);
+#       超过阈值后转存临时文件,读取时通过 mmap 映射,不再占用进程堆内存
+# 视图: view() 返回 memoryview,HDFS上传直接使用该视图,无额外复制
+class SpooledDownload:
+    def __init__(self, max_size, spool_threshold=2 * 1024 * 1024, expected_size=None, spool_dir=None):
+        """
+        参数:
+            max_size: 最大接收字节数(超出部分丢弃)
+            spool_threshold: 内存缓冲上限,超过后转存临时文件
+            expected_size: 预期大小(如Content-Length),用于预分配缓冲区
+            spool_dir: 临时文件目录(None为系统默认)
+        """
+        self.max_size = max_size
+        self.spool_threshold = spool_threshold
+        self.spool_dir = spool_dir
+        self.md5 = hashlib.md5()
+        self.size = 0
+        self.path = None        # 转存后的临时文件路径
+        self._file = None
+        self._mmap = None
+        self._view = None
+
+        if expected_size and expected_size > spool_threshold:
+            self._buf = None
+            self._spool()
+        else:
+            self._buf = bytearray(min(expected_size or 64 * 1024, spool_threshold))
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def spooled(self):
+        return self.path is not None
+
+    def _spool(self):
+        # 转存到临时文件(已有内存数据一并写入)
+        fd, self.path = tempfile.mkstemp(prefix='ustc_ingest_', dir=self.spool_dir)
+        self._file = os.fdopen(fd, 'w+b')
+        if self._buf is not None and self.size:
+            self._file.write(memoryview(self._buf)[:self.size])
+        self._buf = None
+
+    def write(self, chunk):
+        """追加一块数据
+
+        返回:
+            False 表示已达到 max_size(调用方应停止读取)
+        """
+        room = self.max_size - self.size
+        if room <= 0:
+            return False
+        if len(chunk) > room:
+            chunk = memoryview(chunk)[:room]
+        self.md5.update(chunk)
+        end = self.size + len(chunk)
+
+        if self._file is None and end > self.spool_threshold:
+            self._spool()
+        if self._file is not None:
+            self._file.write(chunk)
+        else:
+            if end > len(self._buf):
+                # 容量倍增(均摊O(1)),上限为转存阈值
+                grow = min(max(len(self._buf) * 2, end), self.spool_threshold) - len(self._buf)
+                self._buf.extend(bytes(grow))
+            self._buf[self.size:end] = chunk
+        self.size = end
+        return self.size < self.max_size
+
+    def hexdigest(self):
+        return self.md5.hexdigest()
+
+    def view(self):
+        # 只读视图: 内存模式为 bytearray 切片视图,转存模式为 mmap 视图
+        if self._view is None:
+            if self._file is not None:
+                self._file.flush()
+                if self.size == 0:
+                    return memoryview(b"")
+                self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+                self._view = memoryview(self._mmap)
+            else:
+                self._view = memoryview(self._buf)[:self.size].toreadonly()
+        return self._view
+
+    def parse_source(self):
+        """供解析进程使用的数据源
+
+        返回:
+            转存模式返回临时文件路径(子进程按路径读取,跨进程零复制);
+            内存模式返回 bytes(小文件,序列化开销可忽略)
+        """
+        if self.spooled:
+            self._file.flush()
+            return self.path
+        return bytes(self.view())
+
+    def close(self):
+        # 释放视图/映射并删除临时文件(需在上传与解析都完成后调用)
+        if self._view is not None:
+            try:
+                self._view.release()
+            except BufferError:
+                pass
+            self._view = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # 仍有派生视图被引用,交由垃圾回收关闭
+                pass
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.path = None
+        self._buf = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+import html
+import re
+from urllib.parse import urljoin
+
+# 文档链接后缀(加入队头优先抓取)
+DOC_EXTS = ('.pdf', '.doc', '.docx', '.xls', '.xlsx')
+
+# 非抓取目标的链接协议
+_SKIP_PREFIXES = ('javascript:', 'mailto:', 'tel:', 'data:', '#')
+
+# 流式href扫描: 只匹配 <a ...> 开始标签中的 href 属性值(双引号/单引号/无引号)
+_A_HREF_RE = re.compile(
+    rb'<a\s[^>]*?\bhref\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>"\']+))',
+    re.IGNORECASE,
+)
+
+
+def _decode(content, encoding):
+    return content.decode(encoding or 'utf-8', errors='ignore')
+
+
+def extract_bs4(content, encoding=None):
+    # 原有方式: 构建完整DOM树后查找 <a href>
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(_decode(content, encoding), 'html.parser')
+    return [a['href'] for a in soup.find_all('a', href=True)]
+
+
+def extract_lxml(content, encoding=None):
+    # lxml(C实现)直接解析原始字节,XPath一次取出全部href
+    import lxml.html
+    from lxml.etree import ParserError
+    parser = lxml.html.HTMLParser(encoding=encoding or 'utf-8')
+    try:
+        doc = lxml.html.document_fromstring(content, parser=parser)
+    except ParserError:
+        # 空文档
+        return []
+    return [str(h) for h in doc.xpath('//a/@href')]
+
+
+def extract_regex(content, encoding=None):
+    # 不建树: 正则扫描原始字节中的 <a href>,仅对命中的属性值解码与实体反转义
+    # 注释/脚本中的链接也会被提取,由后续域名过滤与去重兜底
+    enc = encoding or 'utf-8'
+    hrefs = []
+    for m in _A_HREF_RE.finditer(content):
+        raw = m.group(1) or m.group(2) or m.group(3) or b''
+        href = raw.decode(enc, errors='ignore')
+        hrefs.append(html.unescape(href) if '&' in href else href)
+    return hrefs
+
+
+EXTRACTORS = {
+    'bs4': extract_bs4,
+    'lxml': extract_lxml,
+    'regex': extract_regex,
+}
+
+
+def get_extractor(name):
+    """按名称获取链接提取函数
+
+    说明:
+        - lxml 未安装时退回 regex(同样不依赖DOM树构建)
+    返回:
+        extract(content: bytes, encoding) -> [href]
+    """
+    if name not in EXTRACTORS:
+        raise ValueError(f"Unknown link extractor: {name}")
+    if name == 'lxml':
+        try:
+            import lxml.html  # noqa: F401
+        except ImportError:
+            return extract_regex
+    return EXTRACTORS[name]
+
+
+def normalize_links(base_url, hrefs, url_filter=None):
+    """批量规范化页面链接
+
+    参数:
+        base_url: 页面URL(相对路径基准)
+        hrefs: 原始href列表
+        url_filter: urlfilter.UrlFilter(规范化+站外/陷阱过滤); None为仅去除片段
+    返回:
+        [(规范URL, 是否文档链接, 改写信息)]: 页内去重,保持出现顺序
+        改写信息为 None 或 (原始URL, 改写规则),供frontier统计规范化节省的抓取;
+        同一规范URL的不同原始写法各保留一项(由frontier判定重复并计数)
+    """
+    seen = {}
+    for href in hrefs:
+        href = href.strip()
+        if not href or href.lower().startswith(_SKIP_PREFIXES):
+            continue
+        full = urljoin(base_url, href)
+        if url_filter is None:
+            url, rules = full.split('#')[0], ()
+        else:
+            url, rules = url_filter.canonicalize(full)
+            if url is None:
+                # 被过滤(rules为过滤规则): 避免了一次抓取
+                url_filter.record(rules)
+                continue
+        key = (url, full) if rules else (url, None)
+        if key in seen:
+            continue
+        low = url.lower()
+        seen[key] = (any(ext in low for ext in DOC_EXTS), (full, rules) if rules else None)
+    return [(url, is_doc, rewrite) for (url, _), (is_doc, rewrite) in seen.items()]
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+import argparse
+import json
+import logging
+import math
+import os
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import happybase
+import jieba
+import jieba.analyse
+
+from crawler import Config as CrawlerConfig, ContentParser
+from indexer import IndexConfig, InvertedIndex
+
+# Configuration
+class ReindexConfig:
+    WORKERS = os.cpu_count() or 4      # 分词/关键词计算进程数
+    CHUNK_SIZE = 100                   # 每个任务包含的文档数
+    MAX_INFLIGHT = 2                   # 每个进程的在途任务数(限制内存占用)
+    IDF_PATH = './corpus_idf.txt'      # 语料IDF输出文件(Jieba idf格式: 词项 IDF值)
+    STATE_PATH = './reindex_state.json'  # 进度文件(已写回的最后行键,用于 --resume)
+
+logger = logging.getLogger("USTC_Reindex")
+
+
+def connect():
+    conn = happybase.Connection(IndexConfig.HBASE_HOST, port=IndexConfig.HBASE_PORT, timeout=30000)
+    conn.open()
+    return conn
+
+
+def idf_terms(text):
+    # 与 jieba.analyse.extract_tags 一致的切词与过滤(精确模式,长度>=2,去停用词)
+    stop_words = jieba.analyse.default_tfidf.stop_words
+    return {w for w in jieba.cut(text) if len(w.strip()) >= 2 and w.lower() not in stop_words}
+
+
+def count_df(texts):
+    # 工作进程: 统计一批文档的词项文档频率
+    df = Counter()
+    for text in texts:
+        df.update(idf_terms(text))
+    return df
+
+
+def _init_keyword_worker(idf_path):
+    # 工作进程初始化: 关键词抽取使用语料IDF(与爬虫共用 ContentParser.extract_keywords)
+    CrawlerConfig.KEYWORD_IDF_PATH = idf_path
+
+
+def extract_chunk(rows):
+    # 工作进程: [(行键, 正文, 标题)] -> [关键词](与输入同序)
+    return [ContentParser.extract_keywords(text) for _, text, _ in rows]
+
+
+def extract_and_analyze_chunk(rows):
+    # 工作进程: 关键词与倒排索引分词一并计算 -> [(关键词, postings, 文档长度)](与输入同序)
+    results = []
+    for _, text, title in rows:
+        keywords = ContentParser.extract_keywords(text)
+        results.append((keywords,) + InvertedIndex.analyze(title, keywords, text))
+    return results
+
+
+def scan_chunks(table, columns, row_start, row_stop, size):
+    # 按行键顺序分批读取 (行键, 正文, 标题); 未读取标题列时标题为空串
+    chunk = []
+    for key, data in table.scan(row_start=row_start, row_stop=row_stop, columns=columns, batch_size=size):
+        chunk.append((key, data.get(b'data:content', b'').decode('utf-8', 'ignore'),
+                      data.get(b'meta:title', b'').decode('utf-8', 'ignore')))
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def bounded_map(pool, func, chunks, inflight):
+    """按提交顺序返回结果,同时最多 inflight 个任务在途(扫描速度受处理速度约束)"""
+    pending = deque()
+    for chunk in chunks:
+        pending.append((chunk, pool.submit(func, chunk)))
+        if len(pending) >= inflight:
+            chunk, future = pending.popleft()
+            yield chunk, future.result()
+    while pending:
+        chunk, future = pending.popleft()
+        yield chunk, future.result()
+
+
+def compute_idf(conn, path, workers):
+    """全表统计文档频率并写出语料IDF文件
+
+    返回:
+        文档总数
+    说明:
+        - IDF = ln(N / df),格式与Jieba默认idf.txt一致,未登录词由Jieba取中位数IDF
+    """
+    table = conn.table(IndexConfig.DATA_TABLE)
+    df = Counter()
+    docs = 0
+    start = time.time()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunks = (
+            [text for _, text, _ in chunk]
+            for chunk in scan_chunks(table, [b'data:content'], None, None, ReindexConfig.CHUNK_SIZE)
+        )
+        for texts, partial in bounded_map(pool, count_df, chunks, workers * ReindexConfig.MAX_INFLIGHT):
+            df.update(partial)
+            docs += len(texts)
+            if docs % 1000 < ReindexConfig.CHUNK_SIZE:
+                logger.info(f"IDF pass: {docs} documents, {len(df)} terms...")
+
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        for term, n in df.items():
+            f.write(f"{term} {math.log(docs / n):.6f}\n")
+    os.replace(tmp, path)
+    logger.info(f"IDF written to {path}: {docs} documents, {len(df)} terms in {time.time() - start:.0f}s")
+    return docs
+
+
+def save_state(last_key, args):
+    tmp = ReindexConfig.STATE_PATH + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'last_key': last_key.decode(), 'row_stop': args.stop, 'idf_path': args.idf,
+                   'saved_at': time.strftime("%Y-%m-%d %H:%M:%S")}, f)
+    os.replace(tmp, ReindexConfig.STATE_PATH)
+
+
+def rewrite_keywords(conn, row_start, row_stop, args):
+    """按行键顺序重新抽取关键词并批量写回 index:keywords
+
+    返回:
+        处理的文档数
+    说明:
+        - 结果按扫描顺序写回,每批写入后记录最后行键,中断后 --resume 从下一行继续
+        - 关键词参与BM25字段加权: 每批写回后逐行增量更新倒排索引(不删除索引表,Web应用检索不中断)
+        - 索引分词在工作进程中与关键词抽取一并完成; 每批只递增一次数据版本号(Web应用缓存按批失效)
+    """
+    table = conn.table(IndexConfig.DATA_TABLE)
+    index = None if args.skip_index else InvertedIndex(conn)
+    func = extract_chunk if index is None else extract_and_analyze_chunk
+    done = 0
+    start = time.time()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_keyword_worker,
+                             initargs=(args.idf,)) as pool:
+        chunks = scan_chunks(table, [b'data:content', b'meta:title'], row_start, row_stop, ReindexConfig.CHUNK_SIZE)
+        for chunk, results in bounded_map(pool, func, chunks, args.workers * ReindexConfig.MAX_INFLIGHT):
+            keywords_list = results if index is None else [keywords for keywords, _, _ in results]
+            with table.batch() as batch:
+                for (key, _, _), keywords in zip(chunk, keywords_list):
+                    batch.put(key, {b'index:keywords': keywords.encode('utf-8', 'ignore')})
+            if index is not None:
+                for (key, _, _), (_, postings, doc_len) in zip(chunk, results):
+                    index.add_analyzed(key, postings, doc_len, bump=False)
+                index.bump_generation()
+            save_state(chunk[-1][0], args)
+            done += len(chunk)
+            if done % 1000 < ReindexConfig.CHUNK_SIZE:
+                rate = done / max(time.time() - start, 1e-6)
+                logger.info(f"Keywords: {done} documents ({rate:.1f} docs/s), last row key: {chunk[-1][0].decode()}")
+    logger.info(f"Keyword rewrite finished: {done} documents in {time.time() - start:.0f}s")
+    return done
+
+
+# Entry point
+# 用法:
+#   python reindex.py                         全量: 统计语料IDF -> 多进程重算关键词并增量更新倒排索引
+#   python reindex.py --start 80 --stop c0    仅处理行键区间 [80, c0)
+#   python reindex.py --resume                从上次中断处继续(复用已生成的IDF)
+if __name__ == '__main__':
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter('%(asctime)s [%(levelname)s] %(message)s', datefmt='%H:%M:%S'))
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+
+    parser = argparse.ArgumentParser(description="Offline keyword re-extraction with corpus IDF")
+    parser.add_argument('--start', help="first row key (inclusive)")
+    parser.add_argument('--stop', help="last row key (exclusive)")
+    parser.add_argument('--resume', action='store_true', help="continue after the last saved row key")
+    parser.add_argument('--idf', default=ReindexConfig.IDF_PATH, help="corpus IDF file")
+    parser.add_argument('--reuse-idf', action='store_true', help="skip the IDF pass if the file exists")
+    parser.add_argument('--workers', type=int, default=ReindexConfig.WORKERS)
+    parser.add_argument('--skip-index', action='store_true', help="do not update the inverted index")
+    args = parser.parse_args()
+
+    row_start = args.start.encode() if args.start else None
+    if args.resume:
+        with open(ReindexConfig.STATE_PATH, encoding='utf-8') as f:
+            state = json.load(f)
+        # 从已写回的最后行键之后继续('\0'后缀即严格大于该行键的最小行键)
+        row_start = state['last_key'].encode() + b'\0'
+        args.stop = args.stop or state.get('row_stop')
+        args.idf = state.get('idf_path') or args.idf
+        args.reuse_idf = True
+        logger.info(f"Resuming after row key {state['last_key']} (saved {state['saved_at']})")
+    row_stop = args.stop.encode() if args.stop else None
+
+    conn = connect()
+    try:
+        if not (args.reuse_idf and os.path.exists(args.idf)):
+            compute_idf(conn, args.idf, args.workers)
+        rewrite_keywords(conn, row_start, row_stop, args)
+        if args.skip_index:
+            logger.warning("Inverted index not updated: keyword postings are stale until 'python indexer.py build'")
+    finally:
+        conn.close()
+    if os.path.exists(ReindexConfig.STATE_PATH) and not args.stop:
+        os.remove(ReindexConfig.STATE_PATH)
+    logger.info(f"Set Config.KEYWORD_IDF_PATH = '{args.idf}' in crawler.py to use the corpus IDF for new documents")
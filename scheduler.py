@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+import random
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+
+def host_of(url):
+    # 调度粒度: 主机名(含端口),各子域名独立限速
+    return urlparse(url).netloc.lower()
+
+
+# Adaptive throttle
+# 职责: 按主机根据服务器反馈调整请求间隔(AIMD),取代固定的随机延时
+# 规则:
+#   - 响应正常且延迟不超过 target_latency: 间隔减少 step(加性增速)
+#   - 响应变慢/超时/5xx: 间隔乘以 factor(乘性减速)
+#   - 429/503: 同上,且在 Retry-After 到期前不再请求该主机
+#   - 连接被重置/中止(如10053): 同上,且至少冷却 reset_cooldown 秒
+#   - 仅影响出现问题的主机,其他主机维持各自的速率
+class AdaptiveThrottle:
+    def __init__(self, initial_delay=1.0, min_delay=0.25, max_delay=60.0, step=0.25, factor=2.0,
+                 target_latency=2.0, reset_cooldown=10.0, max_retry_after=600.0, jitter=0.2, host_min_delays=None):
+        """
+        参数:
+            initial_delay: 新主机的初始间隔(秒)
+            min_delay / max_delay: 间隔上下限(秒)
+            step: 每次正常响应减少的间隔(秒)
+            factor: 每次拥塞信号间隔的放大倍数
+            target_latency: 响应延迟(到响应头)超过该值视为服务器变慢(秒)
+            reset_cooldown: 连接被重置后的最短冷却时间(秒)
+            max_retry_after: Retry-After 的采纳上限(秒),防止异常值使主机永久停抓
+            jitter: 间隔随机抖动比例,避免固定节奏
+            host_min_delays: 按主机覆盖间隔下限, {主机: 秒}
+        """
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.step = step
+        self.factor = factor
+        self.target_latency = target_latency
+        self.reset_cooldown = reset_cooldown
+        self.max_retry_after = max_retry_after
+        self.jitter = jitter
+        self.host_min_delays = dict(host_min_delays or {})
+        self._delay = {}        # host -> 当前间隔
+        self._hold = {}         # host -> 本次额外冷却(Retry-After/连接重置),取用后清除
+        self._lock = threading.Lock()
+
+    def _floor(self, host):
+        return max(self.min_delay, self.host_min_delays.get(host, 0.0))
+
+    def set_min_delay(self, host, seconds):
+        # 提高该主机的间隔下限(如 robots.txt 的 Crawl-delay),不低于已配置的下限
+        with self._lock:
+            floor = max(self.host_min_delays.get(host, 0.0), min(seconds, self.max_delay))
+            self.host_min_delays[host] = floor
+            if host in self._delay:
+                self._delay[host] = max(self._delay[host], floor)
+
+    def record(self, host, signal, latency=None, retry_after=None):
+        """记录一次请求结果并调整该主机的间隔
+
+        参数:
+            signal: 'ok' | 'throttled'(429/503) | 'server_error'(其他5xx/超时) | 'reset'(连接重置)
+                    ('ok' 且 latency 超过 target_latency 时按 'slow' 处理)
+            latency: 到收到响应头的耗时(秒)
+            retry_after: 服务器要求的等待秒数(已解析)
+        返回:
+            实际采用的信号
+        """
+        if signal == 'ok' and latency is not None and latency > self.target_latency:
+            signal = 'slow'
+        with self._lock:
+            floor = self._floor(host)
+            delay = self._delay.get(host, max(self.initial_delay, floor))
+            if signal == 'ok':
+                delay = max(floor, delay - self.step)
+            else:
+                delay = min(self.max_delay, max(delay, self.step, floor) * self.factor)
+                hold = 0.0
+                if signal == 'reset':
+                    hold = self.reset_cooldown
+                if retry_after:
+                    hold = max(hold, min(retry_after, self.max_retry_after))
+                if hold > delay:
+                    self._hold[host] = hold
+            self._delay[host] = delay
+        return signal
+
+    def delay(self, host):
+        # 该主机当前间隔(不含抖动与冷却)
+        with self._lock:
+            return self._delay.get(host, max(self.initial_delay, self._floor(host)))
+
+    def next_delay(self, host):
+        # 下次请求该主机前的等待秒数(含抖动与一次性冷却)
+        with self._lock:
+            delay = self._delay.get(host, max(self.initial_delay, self._floor(host)))
+            hold = self._hold.pop(host, 0.0)
+        if self.jitter:
+            delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return max(delay, hold)
+
+    def snapshot(self):
+        # 各主机当前间隔(监控/日志用)
+        with self._lock:
+            return dict(self._delay)
+
+
+# Host scheduler
+# 职责: 按主机维护独立队列与礼貌延时,供多个抓取线程并发取任务
+# 规则: 同一主机同一时刻最多一个在途请求; 两次请求间隔由 AdaptiveThrottle 按主机给出
+class HostScheduler:
+    def __init__(self, throttle=None):
+        self.throttle = throttle or AdaptiveThrottle()
+        self._queues = {}       # host -> deque(url)
+        self._next_time = {}    # host -> 最早可再次抓取的时间戳
+        self._busy = set()      # 有在途请求的主机
+        self._pending = 0       # 所有主机队列中的URL总数
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def __len__(self):
+        return self._pending
+
+    def push(self, url, front=False):
+        # 入队: front=True 插入该主机队头(文档链接优先)
+        host = host_of(url)
+        with self._cond:
+            q = self._queues.get(host)
+            if q is None:
+                q = self._queues[host] = deque()
+                self._next_time.setdefault(host, 0.0)
+            if front:
+                q.appendleft(url)
+            else:
+                q.append(url)
+            self._pending += 1
+            self._cond.notify()
+
+    def pop(self):
+        """阻塞获取下一个可抓取的URL
+
+        返回:
+            URL字符串; 队列耗尽且无在途请求(或已关闭)时返回None
+        """
+        with self._cond:
+            while not self._closed:
+                now = time.monotonic()
+                ready_host, wake_at = None, None
+                for host, q in self._queues.items():
+                    if not q or host in self._busy:
+                        continue
+                    t = self._next_time[host]
+                    if t <= now:
+                        ready_host = host
+                        break
+                    if wake_at is None or t < wake_at:
+                        wake_at = t
+
+                if ready_host is not None:
+                    self._busy.add(ready_host)
+                    self._pending -= 1
+                    return self._queues[ready_host].popleft()
+
+                # 无待抓取URL且无在途请求: 任务结束
+                if self._pending == 0 and not self._busy:
+                    self._cond.notify_all()
+                    return None
+                self._cond.wait(None if wake_at is None else wake_at - now)
+            return None
+
+    def done(self, url, delay=None):
+        """标记URL抓取完成,释放主机并设置下次可抓取时间
+
+        参数:
+            delay: 指定的等待秒数(如放回未抓取的URL时为0); 默认由 throttle 按主机给出
+        """
+        host = host_of(url)
+        if delay is None:
+            delay = self.throttle.next_delay(host)
+        with self._cond:
+            self._busy.discard(host)
+            self._next_time[host] = time.monotonic() + delay
+            self._cond.notify_all()
+
+    def snapshot(self):
+        # 当前所有待抓取URL(保持各主机内部顺序),用于检查点
+        with self._cond:
+            return [url for q in self._queues.values() for url in q]
+
+    def close(self):
+        # 停止调度(达到页数上限时调用),唤醒所有等待线程
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+
+# 与 benchmarks 相同: 项目未打包,直接从仓库根目录导入模块; HBase使用 benchmarks 中的内存替身
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+import pytest
+
+from frontier import Frontier
+from scheduler import AdaptiveThrottle, HostScheduler
+
+URL = 'http://www.ustc.edu.cn/a.pdf'
+
+
+def make_frontier(state_dir, max_retries=3):
+    throttle = AdaptiveThrottle(initial_delay=0, min_delay=0, step=0, jitter=0)
+    return Frontier(HostScheduler(throttle), str(state_dir), max_retries=max_retries)
+
+
+def drain(frontier, statuses):
+    # 模拟抓取线程: 按给定状态码序列响应, 503时要求重试; 返回成功抓取的URL
+    statuses = iter(statuses)
+    fetched = []
+    while True:
+        url = frontier.pop()
+        if url is None:
+            return fetched
+        status = next(statuses)
+        if status == 200:
+            fetched.append(url)
+        frontier.done(url, retry=status == 503)
+
+
+def test_503_then_200_is_fetched(tmp_path):
+    frontier = make_frontier(tmp_path)
+    frontier.add(URL)
+    assert drain(frontier, [503, 200]) == [URL]
+    assert not frontier._retries
+
+
+def test_retries_are_bounded(tmp_path):
+    frontier = make_frontier(tmp_path, max_retries=2)
+    frontier.add(URL)
+    assert drain(frontier, [503, 503, 503]) == []
+    assert not frontier._retries
+
+
+def test_retry_waits_for_retry_after(tmp_path):
+    frontier = make_frontier(tmp_path)
+    frontier.add(URL)
+    url = frontier.pop()
+    frontier.scheduler.throttle.record('www.ustc.edu.cn', 'throttled', retry_after=0.2)
+    start = time.monotonic()
+    assert frontier.done(url, retry=True)
+    assert frontier.pop() == URL
+    assert time.monotonic() - start >= 0.2
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {'Retry-After': '0'} if status_code == 503 else {'Content-Type': 'application/pdf'}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.requested = []
+
+    def get(self, url, **kwargs):
+        self.requested.append(url)
+        return FakeResponse(self.statuses.pop(0))
+
+
+def test_crawler_worker_refetches_after_503(tmp_path, monkeypatch):
+    crawler = pytest.importorskip('crawler')
+    monkeypatch.setattr(crawler.Config, 'ROBOTS_ENABLED', False)
+    monkeypatch.setattr(crawler.Config, 'SITEMAP_SEEDING', False)
+    monkeypatch.setattr(crawler.Config, 'RECRAWL_MODE', False)
+
+    # 只构造抓取线程用到的部分(不连接HBase/HDFS)
+    c = crawler.USTCCrawler.__new__(crawler.USTCCrawler)
+    c.frontier = make_frontier(tmp_path)
+    c.scheduler = c.frontier.scheduler
+    c.throttle = c.scheduler.throttle
+    c.meter = crawler.StageMeter()
+    c._state_lock = threading.Lock()
+    c.page_count = c.file_count = c.duplicates = 0
+    c.start_time = time.time()
+    c.session = FakeSession([503, 200])
+    processed = []
+    c._process_response = lambda resp, url, url_hash, validators=None: processed.append(url)
+
+    c.frontier.add(URL)
+    c._worker()
+    assert c.session.requested == [URL, URL]
+    assert processed == [URL]
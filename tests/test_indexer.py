@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+pytest.importorskip('jieba')
+pytest.importorskip('happybase')
+
+import fake_hbase  # noqa: E402
+from indexer import STOP_WORDS, InvertedIndex, tokenize  # noqa: E402
+
+DATA_TABLE = 'test_data'
+INDEX_TABLE = 'test_index'
+
+DOCS = {
+    b'doc1': ('教务处通知', '', '本学期的考试安排和选课说明与注意事项'),
+    b'doc2': ('图书馆开放时间', '', '图书馆的借阅规则与开放时间'),
+    b'doc3': ('研究生招生简章', '', '研究生招生的报名条件和考试科目'),
+}
+
+
+@pytest.fixture
+def index():
+    fake_hbase.SERVER.reset()
+    conn = fake_hbase.FakeConnection()
+    fake_hbase.create_schema(conn, DATA_TABLE, INDEX_TABLE)
+    idx = InvertedIndex(conn, DATA_TABLE, INDEX_TABLE)
+    for key, (title, keywords, content) in DOCS.items():
+        conn.table(DATA_TABLE).put(key, {b'meta:title': title.encode(), b'data:content': content.encode()})
+        idx.add_document(key, title, keywords, content)
+    return idx
+
+
+def test_tokenize_drops_stop_words():
+    terms = tokenize('不存在的词和考试与选课')
+    assert not STOP_WORDS.intersection(terms)
+    assert '考试' in terms and '选课' in terms
+
+
+def test_stop_word_query_does_not_match_corpus(index):
+    # 每个文档都含"的""和""与",但都不含"不存在"
+    assert index.search('不存在的词') == []
+
+
+def test_query_requires_every_term(index):
+    assert [key for key, _ in index.search('考试的安排')] == [b'doc1']
+    assert {key for key, _ in index.search('考试')} == {b'doc1', b'doc3'}
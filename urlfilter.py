@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+import gzip
+import re
+import threading
+from collections import Counter
+from urllib.parse import urlsplit, urlunsplit
+from urllib.robotparser import RobotFileParser
+from xml.etree import ElementTree
+
+# 会话/跟踪参数(不影响页面内容,同一页面会因此产生大量不同URL)
+# 'sid' 等短参数名在不少CMS中表示栏目编号(如 ?sid=3),不列入
+DEFAULT_DROP_PARAMS = ('jsessionid', 'phpsessid', 'aspsessionid', 'sessionid', '_t', 'timestamp', 'spm', 'utm_*')
+
+# 目录默认页(与目录URL为同一页面)
+DEFAULT_INDEX_PAGES = ('index.htm', 'index.html', 'index.php', 'index.jsp', 'index.asp', 'index.aspx', 'index.psp',
+                       'default.htm', 'default.html', 'default.asp', 'default.aspx')
+
+_DEFAULT_PORTS = {'http': 80, 'https': 443}
+_ESCAPE_RE = re.compile(r'%[0-9a-f]{2}')
+_PATH_PARAM_RE = re.compile(r';(?:jsessionid|phpsessid)=[^/?#]*', re.IGNORECASE)
+_DIGITS_RE = re.compile(r'\d+')
+
+_SITEMAP_NS = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+
+
+def host_matches(host, domains):
+    """主机名后缀匹配: host 等于某个域名或为其子域名
+
+    说明:
+        - 以 '.' 为边界比较,evil-ustc.edu.cn / evil.com/?x=ustc.edu.cn 均不匹配 ustc.edu.cn
+    """
+    if not host:
+        return False
+    host = host.lower().rstrip('.')
+    return any(host == d or host.endswith('.' + d) for d in domains)
+
+
+def path_pattern(path, query):
+    # 路径模式: 数字串替换为{n},查询串只保留参数名(日历/翻页等只有数字不同的URL归为同一模式)
+    keys = sorted(p.split('=', 1)[0] for p in query.split('&') if p) if query else []
+    return _DIGITS_RE.sub('{n}', path) + ('?' + '&'.join(keys) if keys else '')
+
+
+# URL filter
+# 职责: 链接规范化(同一页面的不同写法归并为一个URL) + 抓取陷阱过滤 + 按主机/路径模式限量
+# 计数: 每条规则节省的抓取次数(改写类规则在frontier判定重复时计入,过滤类规则在丢弃时计入;
+#       一个URL同时触发多条改写规则时各计一次)
+class UrlFilter:
+    def __init__(self, domains, drop_params=DEFAULT_DROP_PARAMS, index_pages=DEFAULT_INDEX_PAGES,
+                 max_url_length=512, max_path_depth=12, max_segment_repeat=3,
+                 max_per_host=5000, max_per_pattern=500, on_saved=None):
+        """
+        参数:
+            domains: 允许的域名(字符串或元组),按主机名后缀匹配
+            drop_params: 删除的查询参数名(不区分大小写, 'utm_*' 为前缀匹配)
+            index_pages: 视为目录默认页的文件名
+            max_url_length / max_path_depth / max_segment_repeat: 抓取陷阱判定阈值
+            max_per_host: 每个主机最多入队的HTML页面数(文档链接不限)
+            max_per_pattern: 每个(主机, 路径模式)最多入队的HTML页面数
+            on_saved: 回调 on_saved(rule, n),用于导出监控指标
+        """
+        self.domains = tuple(d.lower().lstrip('.') for d in ((domains,) if isinstance(domains, str) else domains or ()))
+        self.drop_exact = {p.lower() for p in drop_params if not p.endswith('*')}
+        self.drop_prefix = tuple(p[:-1].lower() for p in drop_params if p.endswith('*'))
+        self.index_pages = {p.lower() for p in index_pages}
+        self.max_url_length = max_url_length
+        self.max_path_depth = max_path_depth
+        self.max_segment_repeat = max_segment_repeat
+        self.max_per_host = max_per_host
+        self.max_per_pattern = max_per_pattern
+        self.on_saved = on_saved
+        self.saved = Counter()          # 规则 -> 节省的抓取次数
+        self._schemes = {}              # 主机 -> 首次出现的协议(仅用于 'scheme' 规则计数)
+        self._host_counts = Counter()
+        self._pattern_counts = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, rule, n=1):
+        with self._lock:
+            self.saved[rule] += n
+        if self.on_saved:
+            self.on_saved(rule, n)
+
+    def credit(self, rules):
+        # frontier回调: 改写后的URL判定为重复,即这些规则避免了一次抓取
+        for rule in rules:
+            self.record(rule)
+
+    def _drop_param(self, name):
+        name = name.lower()
+        return name in self.drop_exact or name.startswith(self.drop_prefix)
+
+    def dedup_key(self, url):
+        """frontier去重键: 同一页面的以下写法视为同一URL(抓取时仍使用原写法)
+
+        说明:
+            - 去掉协议部分(http/https)
+            - 目录默认页与末尾斜杠: /dir/index.htm、/dir/、/dir 归并
+              (不改写抓取URL: 服务器对 /dir 直接返回200时,页面内相对链接会按上级目录解析)
+        """
+        rest = url.split('://', 1)[-1]
+        path, sep, query = rest.partition('?')
+        head, _, last = path.rpartition('/')
+        path = head if head and last.lower() in self.index_pages else path.rstrip('/')
+        return path + sep + query
+
+    def canonicalize(self, url):
+        """规范化单个绝对URL
+
+        返回:
+            (规范URL, 改写规则元组); 被过滤时返回 (None, 过滤规则)
+        说明:
+            - 改写: 主机名小写与默认端口、片段、会话参数、查询参数排序、百分号编码大小写
+            - 协议、目录默认页与末尾斜杠不改写(路径决定相对链接的解析基准,行键也按抓取URL计算),
+              由 dedup_key 归并; 出现这些写法时仍记 'scheme' / 'index_alias' / 'trailing_slash' 规则用于计数
+            - 过滤: 非http(s)、站外主机(后缀匹配)、过长URL、路径过深或片段重复(如 /a/b/a/b/a/b)
+        """
+        rules = []
+        try:
+            parts = urlsplit(url.strip())
+            port = parts.port
+        except ValueError:
+            return None, 'malformed'
+        scheme = parts.scheme.lower()
+        if scheme not in _DEFAULT_PORTS:
+            return None, 'non_http'
+        host = (parts.hostname or '').rstrip('.')
+        if self.domains and not host_matches(host, self.domains):
+            return None, 'offsite'
+
+        netloc = host if port in (None, _DEFAULT_PORTS[scheme]) else f"{host}:{port}"
+        if netloc != parts.netloc:
+            rules.append('host')
+        with self._lock:
+            first_scheme = self._schemes.setdefault(netloc, scheme)
+        if first_scheme != scheme:
+            rules.append('scheme')
+        if parts.fragment or url.endswith('#'):
+            rules.append('fragment')
+
+        path = parts.path or '/'
+        stripped = _PATH_PARAM_RE.sub('', path)
+        if stripped != path:
+            rules.append('session_param')
+            path = stripped
+        last = path.rpartition('/')[2]
+        if last.lower() in self.index_pages:
+            rules.append('index_alias')
+        elif len(path) > 1 and path.endswith('/'):
+            rules.append('trailing_slash')
+        escaped = _ESCAPE_RE.sub(lambda m: m.group().upper(), path)
+        if escaped != path:
+            rules.append('escape_case')
+            path = escaped
+
+        query = parts.query
+        if query:
+            params = [p for p in query.split('&') if p]
+            kept = [p for p in params if not self._drop_param(p.split('=', 1)[0])]
+            if len(kept) != len(params):
+                rules.append('session_param')
+            ordered = sorted(kept, key=lambda p: p.split('=', 1)[0])
+            if ordered != kept:
+                rules.append('query_order')
+            query = '&'.join(ordered)
+        elif url.endswith('?'):
+            rules.append('empty_query')
+
+        canonical = urlunsplit((scheme, netloc, path, query, ''))
+        if len(canonical) > self.max_url_length:
+            return None, 'too_long'
+        segments = [s for s in path.split('/') if s]
+        if len(segments) > self.max_path_depth:
+            return None, 'too_deep'
+        if segments and max(Counter(segments).values()) >= self.max_segment_repeat:
+            return None, 'repeated_segment'
+        return canonical, tuple(dict.fromkeys(rules))
+
+    def admit(self, url, is_doc=False):
+        """frontier回调: 新URL入队前检查主机/路径模式配额
+
+        说明:
+            - 只统计首次出现的URL; 文档链接(抓取目标)不受配额限制
+        """
+        if is_doc:
+            return True
+        parts = urlsplit(url)
+        pattern = (parts.netloc, path_pattern(parts.path, parts.query))
+        with self._lock:
+            if self.max_per_host and self._host_counts[parts.netloc] >= self.max_per_host:
+                rule = 'host_cap'
+            elif self.max_per_pattern and self._pattern_counts[pattern] >= self.max_per_pattern:
+                rule = 'pattern_cap'
+            else:
+                self._host_counts[parts.netloc] += 1
+                self._pattern_counts[pattern] += 1
+                return True
+        self.record(rule)
+        return False
+
+    def summary(self):
+        with self._lock:
+            return " | ".join(f"{rule} {n}" for rule, n in self.saved.most_common()) or "none"
+
+
+# Robots cache
+# 职责: 按主机获取并缓存 robots.txt(由持有该主机调度权的抓取线程获取,同一主机不会并发获取)
+class RobotsCache:
+    def __init__(self, fetch, user_agent='*'):
+        """
+        参数:
+            fetch: fetch(url) -> (状态码, 响应体bytes); 网络错误时抛出异常
+            user_agent: 匹配 robots.txt 规则的UA名
+        """
+        self.fetch = fetch
+        self.user_agent = user_agent
+        self._parsers = {}      # 主机(netloc) -> RobotFileParser
+        self._lock = threading.Lock()
+
+    def known(self, url):
+        return urlsplit(url).netloc in self._parsers
+
+    def load(self, url):
+        """获取URL所在主机的 robots.txt
+
+        返回:
+            RobotFileParser(401/403视为全部禁止; 404等其他错误视为全部允许)
+        """
+        parts = urlsplit(url)
+        parser = RobotFileParser(f"{parts.scheme}://{parts.netloc}/robots.txt")
+        try:
+            status, body = self.fetch(parser.url)
+        except Exception:
+            status, body = None, b''
+        if status in (401, 403):
+            parser.disallow_all = True
+        elif status == 200:
+            parser.parse(body.decode('utf-8', errors='ignore').splitlines())
+        else:
+            parser.allow_all = True
+        with self._lock:
+            self._parsers[parts.netloc] = parser
+        return parser
+
+    def allowed(self, url):
+        parser = self._parsers.get(urlsplit(url).netloc)
+        return parser is None or parser.can_fetch(self.user_agent, url)
+
+    def crawl_delay(self, url):
+        parser = self._parsers.get(urlsplit(url).netloc)
+        return parser.crawl_delay(self.user_agent) if parser else None
+
+    def sitemaps(self, url):
+        parser = self._parsers.get(urlsplit(url).netloc)
+        return (parser.site_maps() or []) if parser else []
+
+
+def parse_sitemap(content):
+    """解析 sitemap.xml(支持gzip压缩与sitemap索引)
+
+    返回:
+        (页面URL列表, 子sitemap URL列表)
+    """
+    try:
+        if content[:2] == b'\x1f\x8b':
+            content = gzip.decompress(content)
+        root = ElementTree.fromstring(content)
+    except (OSError, EOFError, ElementTree.ParseError):
+        return [], []
+    locs = [el.text.strip() for el in root.iter(_SITEMAP_NS + 'loc') if el.text]
+    if root.tag == _SITEMAP_NS + 'sitemapindex':
+        return [], locs
+    return locs, []
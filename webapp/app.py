@@ -1,47 +1,419 @@
 # -*- coding: utf-8 -*-
 from fastapi import FastAPI, Request, Query
-from fastapi.responses import HTMLResponse, Response
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from urllib.parse import quote
+import mimetypes
+import asyncio
+import heapq
+import itertools
 import happybase
-import subprocess
 import time
 import math
 import uvicorn
 import os
-
-app = FastAPI(title="USTC Search Engine")
+import sys
 
 # Jinja2模板引擎配置(使用脚本所在目录的绝对路径,避免CWD依赖)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 templates = Jinja2Templates(directory=os.path.join(BASE_DIR, "templates"))
 
+# 共享模块(倒排索引等)位于项目根目录
+sys.path.insert(0, os.path.dirname(BASE_DIR))
+from indexer import TF_COLUMN, InvertedIndex, term_counts, tokenize
+from hdfs_backend import HDFSError, create_backend
+from db_pool import HBasePool
+from result_cache import ResultCache, normalize_query
+from suggest import SuggestIndex
+import metrics
+from thriftpy2.transport import TTransportException
+
 # Configuration
 # HBase集群连接参数
 HBASE_HOST = '172.20.194.143'  # HBase主机地址
+HBASE_PORT = 9090
 TABLE_NAME = 'ustc_search_engine'  # 元数据表名
-# HDFS文件读取命令(通过WSL调用)
+INDEX_TABLE = 'ustc_search_index'  # 倒排索引表(由 indexer.py 构建)
+# 连接池参数(连接池大小在线程池参数之后按线程数计算)
+HBASE_POOL_TIMEOUT = 5.0  # 借用连接的最长等待时间(秒)
+HBASE_HEALTH_CHECK_INTERVAL = 60.0  # 连接空闲超过该秒数时借出前先探测
+# 阻塞存储操作(HBase/HDFS)线程池大小,避免阻塞事件循环
+STORAGE_WORKERS = 16
+# 扫描模式: 行键空间分片数(并发扫描,每片占用一个连接)与保留的top-k数量
+SCAN_SHARDS = 4
+SCAN_WORKERS = 8  # 分片扫描线程池大小(独立于存储线程池,避免嵌套提交死锁)
+SCAN_TOP_K = 200
+SCAN_FALLBACK_BATCH = 100  # 缺少 index:tf 的旧数据按批读取正文计分的批大小
+# 连接池大小: 每个存储线程与分片扫描线程同时最多占用一个连接(扫描模式在分片并发前先归还请求线程的连接)
+HBASE_POOL_SIZE = STORAGE_WORKERS + SCAN_WORKERS
+# 查询结果缓存(缓存完整排序列表,翻页直接切片)
+CACHE_MAX_BYTES = 32 * 1024 * 1024  # 内存预算(估算)
+CACHE_TTL = 300.0  # 条目存活时间(秒)
+CACHE_CHECK_INTERVAL = 10.0  # 数据版本号检查间隔(秒),爬虫写入新文档后缓存整体失效
+# 检索模式: 'index'=倒排索引+BM25; 'scan'=全表扫描(索引尚未构建时的后备方案)
+SEARCH_MODE = 'index'
+# HDFS文件读取命令(通过WSL调用,作为WebHDFS不可用时的备用方式)
 HDFS_BIN = "/opt/module/hadoop-3.3.6/bin/hdfs"
+HDFS_BACKEND = 'webhdfs'  # webhdfs | subprocess | local
+HDFS_FALLBACK = 'subprocess'
+HDFS_WEB_URL = 'http://172.20.194.143:9870'  # NameNode WebHDFS地址
+HDFS_USER = None
+HDFS_LOCAL_ROOT = os.path.join(os.path.dirname(BASE_DIR), 'hdfs_local')
+DOWNLOAD_CHUNK_SIZE = 64 * 1024  # 下载流式传输块大小(字节)
+# 输入联想(内存前缀索引,启动时全表加载,后台定期刷新)
+SUGGEST_LIMIT = 8  # 每次返回的候选数上限
+SUGGEST_MIN_DF = 1  # 入选词项的最小文档频率
+SUGGEST_REFRESH_INTERVAL = 600.0  # 后台重建间隔(秒)
+
+# HDFS后端(进程级单例,WebHDFS复用keep-alive连接池)
+hdfs = create_backend(
+    HDFS_BACKEND,
+    web_url=HDFS_WEB_URL,
+    user=HDFS_USER,
+    hdfs_bin=HDFS_BIN,
+    local_root=HDFS_LOCAL_ROOT,
+    fallback=HDFS_FALLBACK,
+    pool_size=STORAGE_WORKERS,
+)
+
+result_cache = ResultCache(CACHE_MAX_BYTES, CACHE_TTL, CACHE_CHECK_INTERVAL)
+
+suggest_index = SuggestIndex(SUGGEST_LIMIT, SUGGEST_MIN_DF)
+
+# 监控指标(GET /metrics, Prometheus文本格式)
+REQUEST_SECONDS = metrics.histogram('webapp_request_seconds', 'HTTP request latency by route', ['route', 'status'])
+STAGE_SECONDS = metrics.histogram('webapp_stage_seconds', 'Time spent in each request stage', ['stage'])
+DOWNLOAD_BYTES = metrics.counter('webapp_download_bytes_total', 'Bytes streamed from HDFS to clients')
+CACHE_STATS = metrics.gauge('webapp_result_cache', 'Result cache statistics', ['stat'])
+POOL_STATS = metrics.gauge('webapp_hbase_pool', 'HBase connection pool statistics', ['stat'])
+EXECUTOR_QUEUE = metrics.gauge('webapp_storage_executor_queued', 'Tasks waiting for a storage worker thread')
+for _stat in ('entries', 'bytes', 'hits', 'misses', 'evictions', 'invalidations'):
+    CACHE_STATS.labels(_stat).set_function(lambda stat=_stat: result_cache.stats()[stat])
+SUGGEST_TERMS = metrics.gauge('webapp_suggest_terms', 'Terms in the in-memory suggest index')
+SUGGEST_TERMS.set_function(lambda: len(suggest_index))
+
+def load_suggest_index():
+    # 全表扫描标题与关键词列(仅两个轻量列)重建联想索引
+    def rows():
+        with app.state.db_pool.connection() as conn:
+            table = conn.table(TABLE_NAME)
+            for _, data in table.scan(columns=[b'meta:title', b'index:keywords'], batch_size=1000):
+                yield (data.get(b'meta:title', b'').decode('utf-8', 'ignore'),
+                       data.get(b'index:keywords', b'').decode('utf-8', 'ignore'))
+
+    with STAGE_SECONDS.labels('suggest_build').time():
+        return suggest_index.build(rows(), tokenize)
+
+async def refresh_suggest_index():
+    # 后台任务: 启动时加载,之后定期重建; 失败时保留旧快照,下个周期重试
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            terms = await loop.run_in_executor(app.state.executor, load_suggest_index)
+            print(f"Suggest index loaded: {terms} terms in {suggest_index.build_seconds:.1f}s")
+        except Exception as e:
+            print(f"Suggest index build failed: {e}")
+        await asyncio.sleep(SUGGEST_REFRESH_INTERVAL)
+
+@asynccontextmanager
+async def lifespan(app):
+    """应用生命周期: 启动时创建HBase连接池与存储线程池,退出时释放"""
+    app.state.db_pool = HBasePool(
+        HBASE_HOST,
+        port=HBASE_PORT,
+        size=HBASE_POOL_SIZE,
+        timeout=5000,
+        acquire_timeout=HBASE_POOL_TIMEOUT,
+        health_check_interval=HBASE_HEALTH_CHECK_INTERVAL,
+    )
+    app.state.executor = ThreadPoolExecutor(max_workers=STORAGE_WORKERS, thread_name_prefix="storage")
+    app.state.scan_executor = ThreadPoolExecutor(max_workers=SCAN_WORKERS, thread_name_prefix="scan")
+    for stat in ('checkouts', 'timeouts', 'reconnects'):
+        POOL_STATS.labels(stat).set_function(lambda stat=stat: app.state.db_pool.stats()[stat])
+    EXECUTOR_QUEUE.set_function(lambda: app.state.executor._work_queue.qsize())
+    # 联想索引在后台加载,不阻塞启动(加载完成前 /suggest 返回空列表)
+    suggest_task = asyncio.create_task(refresh_suggest_index())
+    try:
+        yield
+    finally:
+        suggest_task.cancel()
+        app.state.executor.shutdown(wait=False)
+        app.state.scan_executor.shutdown(wait=False)
+        app.state.db_pool.close()
+        hdfs.close()
+
+app = FastAPI(title="USTC Search Engine", lifespan=lifespan)
+
+@app.middleware("http")
+async def observe_requests(request: Request, call_next):
+    # 请求总耗时(按路由模板聚合,避免行键等路径参数造成标签爆炸)
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get('route')
+    REQUEST_SECONDS.labels(route.path if route else 'unmatched', str(response.status_code)).observe(
+        time.perf_counter() - start)
+    return response
+
+async def run_blocking(func, *args):
+    # 将阻塞的HBase/HDFS调用派发到有界线程池,事件循环可继续处理其他请求
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(app.state.executor, func, *args)
+
+@app.get('/', response_class=HTMLResponse)
+async def index(request: Request):
+    return templates.TemplateResponse("index.html", {"request": request})
 
-def get_db():
-    """获取HBase连接(单次请求级别连接)
+def make_snippet(content, query, terms=()):
+    """摘要生成: 优先截取查询词周边文本(上下文各30/100字)并高亮
+
+    参数:
+        content: 正文文本
+        query: 原始查询串
+        terms: 分词后的查询词项(原串未命中时用于定位和高亮)
+    """
+    marks = [query] + [t for t in terms if t != query]
+    idx = -1
+    for m in marks:
+        idx = content.find(m)
+        if idx != -1:
+            break
+    if idx == -1:
+        # 关键词未命中时使用文本头部作为摘要
+        return content[:120] + "..."
+    start = max(0, idx - 30)
+    end = min(len(content), idx + 100)
+    snippet = content[start:end]
+    # 关键词高亮(<em>标签),仅高亮原串或长度>1的词项避免碎片化
+    for m in marks:
+        if m == query or len(m) > 1:
+            snippet = snippet.replace(m, f"<em>{m}</em>")
+    return snippet + "..."
+
+def decode_result(key, data, score, query, terms=()):
+    # HBase行数据解码为模板所需的结果记录
+    title = data.get(b'meta:title', b'').decode('utf-8', 'ignore')
+    content = data.get(b'data:content', b'').decode('utf-8', 'ignore')
+    kw_str = data.get(b'index:keywords', b'').decode('utf-8', 'ignore')
+    return {
+        'score': score,
+        'row_key': key.decode(),
+        'title': title,
+        'url': data.get(b'meta:url', b'').decode('utf-8', 'ignore'),
+        'date': data.get(b'meta:date', b'').decode('utf-8', 'ignore'),
+        'snippet': make_snippet(content, query, terms),
+        'keywords': kw_str.split(',') if kw_str else []
+    }
+
+def paginate(total_results, page, per_page):
+    """分页计算
 
     返回:
-        HBase连接对象或None(连接失败)
+        (修正后的页码, 总页数, 起始下标, 结束下标)
+    """
+    total_pages = math.ceil(total_results / per_page)  # 向上取整
+    # 页码范围检查(防止越界访问)
+    if page < 1: page = 1
+    if page > total_pages and total_pages > 0: page = total_pages
+    start_idx = (page - 1) * per_page
+    return page, total_pages, start_idx, start_idx + per_page
+
+def rank_index(conn, query):
+    """倒排索引检索: BM25排序
+
+    返回:
+        ([(行键, 得分)] 按得分降序, 命中总数)
+    """
+    index = InvertedIndex(conn, TABLE_NAME, INDEX_TABLE)
+    ranked = [(key, round(score, 3)) for key, score in index.search(query)]
+    return ranked, len(ranked)
+
+# 扫描阶段只读取的轻量列(不含5000字的 data:content; 正文词频取自写入时预计算的 index:tf)
+# 尚未写入 index:tf 的旧数据单独按批读取正文(见 scan_shard)
+SCAN_COLUMNS = [b'meta:title', b'index:keywords', TF_COLUMN]
+CONTENT_COLUMN = b'data:content'
+
+def shard_ranges(shards):
+    """按行键前两位十六进制字符将MD5行键空间均分为N段
+
+    返回:
+        [(row_start, row_stop)] 首段起点与末段终点为None(不限)
+    """
+    bounds = [None] + [format(i * 256 // shards, '02x').encode() for i in range(1, shards)] + [None]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def score_scan_row(query, query_terms, data):
+    """三维相关度计分模型
+
+    参数:
+        query_terms: 查询分词后的词项(UTF-8字节串列表)
+    返回:
+        得分; 搜索词都未命中时返回None(排除)
     说明:
-        - 超时设置5000ms防止长期阻塞
-        - 异常时返回None(由调用者检查)
+        - 正文词频取查询各词项在 index:tf 中的最小词频(近似整串出现次数),无需解码正文
+        - 尚未写入 index:tf 的旧数据(data 中带有 data:content)按正文中整串出现次数计分
+          (可运行 indexer.py backfill-tf 补写,之后不再读取正文)
     """
-    try:
-        conn = happybase.Connection(HBASE_HOST, port=9090, timeout=5000)
-        conn.open()
-        return conn
-    except Exception as e:
-        print(f"HBase connection failed: {e}")
+    # HBase行数据解码: 所有值为字节类型,需转码为字符串
+    title = data.get(b'meta:title', b'').decode('utf-8', 'ignore')
+
+    # 离线关键词索引(由爬虫Jieba生成,逗号分隔)
+    kw_str = data.get(b'index:keywords', b'').decode('utf-8', 'ignore')
+    keywords_list = kw_str.split(',') if kw_str else []
+
+    if TF_COLUMN in data:
+        counts = term_counts(data[TF_COLUMN], query_terms) if query_terms else None
+        term_count = min(counts) if counts else 0
+    else:
+        term_count = data.get(CONTENT_COLUMN, b'').decode('utf-8', 'ignore').count(query)
+
+    # 基础过滤: 搜索词都未命中则排除(减少无关结果)
+    if query not in title and not term_count:
         return None
 
-@app.get('/', response_class=HTMLResponse)
-async def index(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+    score = 0
+    # 维度一: 标题命中(权重100=最重要)
+    if query in title:
+        score += 100
+    # 维度二: 离线关键词命中(权重50=中等重要,反映语义相关性)
+    if query in keywords_list:
+        score += 50
+    # 维度三: 词频计数(上限20,防止长文档刷分)
+    score += min(term_count, 20)
+    return score
+
+def scan_shard(query, query_terms, row_start, row_stop):
+    """扫描一个行键区间,维护有界小顶堆保留该区间的top-k
+
+    返回:
+        (top-k列表[(得分, 行键)], 区间内命中总数)
+    """
+    heap = []
+    hits = 0
+    score_time = 0.0
+    start = time.perf_counter()
+
+    def score_rows(rows):
+        nonlocal hits, score_time
+        t = time.perf_counter()
+        for key, data in rows:
+            score = score_scan_row(query, query_terms, data)
+            if score is None:
+                continue
+            hits += 1
+            if len(heap) < SCAN_TOP_K:
+                heapq.heappush(heap, (score, key))
+            elif (score, key) > heap[0]:
+                heapq.heapreplace(heap, (score, key))
+        score_time += time.perf_counter() - t
+
+    with app.state.db_pool.connection() as conn:
+        table = conn.table(TABLE_NAME)
+
+        def with_content(rows):
+            # 缺少 index:tf 的行: 批量补读正文后计分
+            contents = dict(table.rows([key for key, _ in rows], columns=[CONTENT_COLUMN]))
+            return [(key, {**data, CONTENT_COLUMN: contents.get(key, {}).get(CONTENT_COLUMN, b'')})
+                    for key, data in rows]
+
+        missing = []
+        for key, data in table.scan(row_start=row_start, row_stop=row_stop, columns=SCAN_COLUMNS):
+            if TF_COLUMN not in data:
+                missing.append((key, data))
+                if len(missing) >= SCAN_FALLBACK_BATCH:
+                    score_rows(with_content(missing))
+                    missing = []
+                continue
+            score_rows([(key, data)])
+        if missing:
+            score_rows(with_content(missing))
+    # 扫描耗时不含计分(每行计时累加,每个分片只记录一次)
+    STAGE_SECONDS.labels('scan_score').observe(score_time)
+    STAGE_SECONDS.labels('scan_read').observe(time.perf_counter() - start - score_time)
+    return heap, hits
+
+def rank_scan(query):
+    """并行分片全表扫描(两阶段检索的第一阶段)
+
+    返回:
+        ([(行键, 得分)] 全表top-k按得分降序, 精确命中总数)
+    说明:
+        - 行键空间分为 SCAN_SHARDS 段,各段使用独立连接并发扫描
+        - 仅扫描标题/关键词/词项集合等轻量列,正文在第二阶段按页读取
+        - 各段top-k堆合并后得到全表top-k,排序与行键顺序无关
+        - 任一分片失败则整个检索失败(抛出该分片的异常),不返回部分结果,避免缓存错误的命中总数
+    """
+    query_terms = [t.encode('utf-8') for t in set(tokenize(query))]
+    futures = [app.state.scan_executor.submit(scan_shard, query, query_terms, start, stop)
+               for start, stop in shard_ranges(SCAN_SHARDS)]
+
+    heaps, total_hits = [], 0
+    try:
+        for future in futures:
+            heap, hits = future.result()
+            heaps.append(heap)
+            total_hits += hits
+    except Exception:
+        # 取消尚未开始的分片,异常交由请求处理函数返回错误页
+        for future in futures:
+            future.cancel()
+        raise
+
+    # 多路合并: 按得分降序,同分按行键排序保证结果稳定
+    merged = heapq.nlargest(SCAN_TOP_K, itertools.chain.from_iterable(heaps))
+    return [(key, score) for score, key in merged], total_hits
+
+def fetch_page(conn, page_hits, query, terms=()):
+    """两阶段检索的第二阶段: 仅读取当前页文档行(含正文)并生成结果记录(摘要/高亮)
+
+    参数:
+        page_hits: 当前页的 [(行键, 得分)]
+    """
+    if not page_hits:
+        return []
+    scores = dict(page_hits)
+    columns = [b'meta:title', b'meta:url', b'meta:date', b'data:content', b'index:keywords']
+    with STAGE_SECONDS.labels('fetch_rows').time():
+        rows = conn.table(TABLE_NAME).rows([k for k, _ in page_hits], columns=columns)
+    with STAGE_SECONDS.labels('decode').time():
+        results = [decode_result(key, data, scores[key], query, terms) for key, data in rows]
+    # table.rows 不保证返回顺序,按得分重新排序
+    results.sort(key=lambda x: x['score'], reverse=True)
+    return results
+
+def search_page(pool, query, page, per_page):
+    """检索入口: 排序结果优先取自缓存,仅读取当前页文档
+
+    参数:
+        pool: HBase连接池(各阶段分别借用连接)
+    返回:
+        (当前页结果, 命中总数, 页码, 总页数)
+    说明:
+        - 扫描模式下分片并发前不持有连接,避免请求线程与分片线程同时占用连接导致连接池耗尽
+        - 排序失败时异常向上抛出,不写入缓存
+    """
+    cache_key = (SEARCH_MODE, normalize_query(query))
+    with pool.connection() as conn:
+        result_cache.check_generation(InvertedIndex(conn, TABLE_NAME, INDEX_TABLE).generation)
+        cached = result_cache.get(cache_key)
+        if cached is None and SEARCH_MODE == 'index':
+            with STAGE_SECONDS.labels('rank_index').time():
+                cached = rank_index(conn, query)
+            result_cache.put(cache_key, *cached)
+    if cached is None:
+        with STAGE_SECONDS.labels('rank_scan').time():
+            cached = rank_scan(query)
+        result_cache.put(cache_key, *cached)
+    ranked, total_results = cached  # total_results: 实际命中总数(扫描模式下可能多于保留的top-k)
+
+    # 分页范围以可展示的排序结果为准
+    page, total_pages, start_idx, end_idx = paginate(len(ranked), page, per_page)
+    terms = tokenize(query)
+    with pool.connection() as conn:
+        return fetch_page(conn, ranked[start_idx:end_idx], query, terms), total_results, page, total_pages
 
 @app.get('/search', response_class=HTMLResponse)
 async def search(request: Request, q: str = "", page: int = Query(default=1, ge=1)):
@@ -53,132 +425,125 @@ async def search(request: Request, q: str = "", page: int = Query(default=1, ge=
     if not query:
         return templates.TemplateResponse("index.html", {"request": request})
 
-    conn = get_db()
-    if not conn:
-        return HTMLResponse("<h3>Database connection failed</h3>", status_code=500)
-
-    table = conn.table(TABLE_NAME)
+    def run_search():
+        # 在存储线程池中执行: 各阶段从连接池借用连接,结束后自动归还
+        return search_page(app.state.db_pool, query, page, per_page)
 
-    # 内存缓存所有候选结果,用于排序和分页
-    scored_results = []
     start_time = time.time()  # 记录查询耗时(用于计算返回)
-
-    # 全表扫描+过滤(生产环境应使用倒排索引)
     try:
-        for key, data in table.scan():
-            # HBase行数据解码: 所有值为字节类型,需转码为字符串
-            title = data.get(b'meta:title', b'').decode('utf-8', 'ignore')
-            content = data.get(b'data:content', b'').decode('utf-8', 'ignore')
-            url = data.get(b'meta:url', b'').decode('utf-8', 'ignore')
-            date = data.get(b'meta:date', b'').decode('utf-8', 'ignore')
-
-            # 离线关键词索引(由爬虫Jieba生成,逗号分隔)
-            kw_str = data.get(b'index:keywords', b'').decode('utf-8', 'ignore')
-            keywords_list = kw_str.split(',') if kw_str else []
-
-            # 三维相关度计分模型
-            score = 0
-
-            # 基础过滤: 搜索词都未命中则排除(减少无关结果)
-            if query not in title and query not in content:
-                continue
-
-            # 维度一: 标题命中(权重100=最重要)
-            if query in title:
-                score += 100
-
-            # 维度二: 离线关键词命中(权重50=中等重要,反映语义相关性)
-            if query in keywords_list:
-                score += 50
-
-            # 维度三: 正文词频(权重1,上限20=避免被堆砌词汇影响)
-            term_count = content.count(query)
-            score += min(term_count, 20)
-
-            # 摘要生成: 优先截取关键词周边文本(上下文各30/100字)
-            idx = content.find(query)
-            if idx != -1:
-                start = max(0, idx - 30)
-                end = min(len(content), idx + 100)
-                # 关键词高亮(<em>标签)
-                snippet = content[start:end].replace(query, f"<em>{query}</em>") + "..."
-            else:
-                # 关键词未命中时使用文本头部作为摘要
-                snippet = content[:120] + "..."
-
-            # 打包结果记录
-            scored_results.append({
-                'score': score,
-                'row_key': key.decode(),
-                'title': title,
-                'url': url,
-                'date': date,
-                'snippet': snippet,
-                'keywords': keywords_list
-            })
-
-            # 限制候选集大小为200(平衡召回与响应速度)
-            if len(scored_results) >= 200:
-                break
-
+        results, total_results, page, total_pages = await run_blocking(run_search)
+    except happybase.NoConnectionsAvailable:
+        return HTMLResponse("<h3>Database busy, please retry</h3>", status_code=503)
+    except (TTransportException, OSError):
+        return HTMLResponse("<h3>Database connection failed</h3>", status_code=500)
     except Exception as e:
-        # 表扫描异常记录日志,返回已扫描结果
-        print(f"Search error: {e}")
-    finally:
-        # 必须关闭连接释放资源
-        conn.close()
-
-    # 按相关度分数从高到低排序
-    scored_results.sort(key=lambda x: x['score'], reverse=True)
-    # 内存分页(结果集较小,直接切片)
-    total_results = len(scored_results)  # 实际命中总数
-    total_pages = math.ceil(total_results / per_page)  # 向上取整
-
-    # 页码范围检查(防止越界访问)
-    if page < 1: page = 1
-    if page > total_pages and total_pages > 0: page = total_pages
-
-    # 计算切片位置(0-based索引)
-    start_idx = (page - 1) * per_page
-    end_idx = start_idx + per_page
-    current_page_results = scored_results[start_idx:end_idx]
+        # 分片/扫描失败等意外错误: 返回错误页而非"0条结果"(排序失败时 search_page 不写入结果缓存)
+        print(f"Search error: {type(e).__name__}: {e}")
+        return HTMLResponse("<h3>Search failed, please retry</h3>", status_code=500)
 
     # 查询总耗时(毫秒精度)
     cost_time = round(time.time() - start_time, 3)
 
-    return templates.TemplateResponse(
-        'result.html',
-        {
-            "request": request,
-            "query": query,
-            "results": current_page_results,
-            "count": total_results,
-            "time": cost_time,
-            "page": page,
-            "total_pages": total_pages,
-        }
-    )
+    # TemplateResponse 在构造时完成渲染
+    with STAGE_SECONDS.labels('render').time():
+        return templates.TemplateResponse(
+            'result.html',
+            {
+                "request": request,
+                "query": query,
+                "results": results,
+                "count": total_results,
+                "time": cost_time,
+                "page": page,
+                "total_pages": total_pages,
+            }
+        )
+
+def parse_range(range_header, size):
+    """解析单段 Range 请求头
+
+    参数:
+        range_header: 形如 bytes=0-1023 / bytes=1024- / bytes=-500
+        size: 文件总字节数
+    返回:
+        (start, end) 闭区间; 格式不支持时返回None(按完整文件响应)
+    异常:
+        ValueError: 范围不可满足(应返回416)
+    """
+    unit, _, spec = range_header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+    first, _, last = spec.strip().partition('-')
+    try:
+        if first == '':
+            # 后缀范围: 最后N字节
+            suffix = int(last)
+            if suffix <= 0:
+                raise ValueError(range_header)
+            return max(0, size - suffix), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        raise ValueError(range_header)
+    if start >= size or end < start:
+        raise ValueError(range_header)
+    return start, min(end, size - 1)
+
+def close_quietly(chunks):
+    try:
+        chunks.close()
+    except Exception as e:
+        print(f"HDFS reader close error: {e}")
+
+async def stream_hdfs(hdfs_path, offset, length):
+    # 逐块从HDFS读取并发送,阻塞读取在存储线程池中执行,内存占用仅为单个块
+    # 客户端断开时生成器被取消,finally 中不能再 await(会再次被取消,读取器泄漏):
+    #   无在途读取时同步关闭; 读取仍在线程池中执行时,由该读取完成的回调关闭(生成器不能并发关闭)
+    chunks = hdfs.iter_read(hdfs_path, DOWNLOAD_CHUNK_SIZE, offset, length)
+    end = object()
+    read_time = 0.0
+    reading = None
+    try:
+        while True:
+            start = time.perf_counter()
+            reading = app.state.executor.submit(next, chunks, end)
+            chunk = await asyncio.wrap_future(reading)
+            read_time += time.perf_counter() - start
+            if chunk is end:
+                break
+            DOWNLOAD_BYTES.inc(len(chunk))
+            yield chunk
+    finally:
+        STAGE_SECONDS.labels('hdfs_read').observe(read_time)
+        if reading is None:
+            close_quietly(chunks)
+        else:
+            reading.add_done_callback(lambda _: close_quietly(chunks))
 
 @app.get('/download/{row_key:path}')
-async def download(row_key: str):
+async def download(request: Request, row_key: str):
     """从HDFS下载文件
 
     参数:
         row_key: HBase行键(URL的MD5哈希)
     流程:
         1. 查询HBase获取HDFS路径和元数据
-        2. 通过WSL调用HDFS读取文件二进制数据
-        3. 流式传输到浏览器(触发下载)
+        2. 条件请求检查: ETag(HDFS文件名中的内容MD5) / Last-Modified(采集日期),未变化返回304
+        3. 按 Range 请求头从HDFS分块流式传输到浏览器(支持断点续传与PDF阅读器按需加载)
     """
-    conn = get_db()
-    if not conn:
-        return HTMLResponse("Database connection failed", status_code=500)
+    def load_meta():
+        with app.state.db_pool.connection() as conn:
+            # HBase Get操作: 按行键查询单行数据(仅取下载所需列)
+            return conn.table(TABLE_NAME).row(
+                row_key.encode(), columns=[b'data:hdfs_path', b'meta:title', b'meta:date'])
+
     try:
-        table = conn.table(TABLE_NAME)
-        # HBase Get操作: 按行键查询单行数据
-        data = table.row(row_key.encode())
-    finally:
-        conn.close()  # 及时释放连接
+        with STAGE_SECONDS.labels('download_meta').time():
+            data = await run_blocking(load_meta)
+    except happybase.NoConnectionsAvailable:
+        return HTMLResponse("Database busy, please retry", status_code=503)
+    except (TTransportException, OSError):
+        return HTMLResponse("Database connection failed", status_code=500)
 
     # 元数据缺失返回404(文件可能已被删除)
     if not data:
@@ -187,32 +552,95 @@ async def download(row_key: str):
     # 从HBase读取HDFS存储路径和原始文件名
     hdfs_path = data.get(b'data:hdfs_path', b'').decode()
     file_name = data.get(b'meta:title', b'download.file').decode('utf-8', 'ignore')
-    # WSL子进程调用hdfs命令读取文件内容(避免本地临时文件)
-    cmd = f'wsl {HDFS_BIN} dfs -cat "{hdfs_path}"'
 
+    # HDFS文件名即内容MD5,内容不可变,可直接作为强校验ETag
+    content_hash = os.path.splitext(os.path.basename(hdfs_path))[0]
+    etag = f'"{content_hash}"'
+    last_modified = None
     try:
-        # 启动子进程执行HDFS读取命令
-        process = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        # 同步等待进程完成,获取标准输出和标准错误
-        file_data, stderr = process.communicate()
-
-        # 进程执行失败或文件为空
-        if process.returncode != 0 or len(file_data) == 0:
-            return HTMLResponse(f"HDFS read failed: {stderr.decode()}", status_code=500)
-
-        # 将二进制数据流发送给客户端(触发下载)
-        from urllib.parse import quote
-        encoded_filename = quote(file_name)
-        return Response(
-            content=file_data,
-            media_type="application/octet-stream",
-            headers={
-                "Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}"
-            }
-        )
-    except Exception as e:
-        # 系统异常(如权限问题、进程异常)
-        return HTMLResponse(f"System error: {e}", status_code=500)
+        crawl_date = datetime.strptime(data.get(b'meta:date', b'').decode(), "%Y-%m-%d")
+        last_modified = crawl_date.replace(tzinfo=timezone.utc)
+    except ValueError:
+        pass
+
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=0, must-revalidate",
+    }
+    if last_modified:
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+
+    # 条件请求: If-None-Match 优先于 If-Modified-Since
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match:
+        tags = [t.strip() for t in if_none_match.split(',')]
+        tags = [t[2:] if t.startswith('W/') else t for t in tags]
+        if etag in tags or '*' in tags:
+            return Response(status_code=304, headers=headers)
+    elif last_modified and request.headers.get('if-modified-since'):
+        try:
+            if last_modified <= parsedate_to_datetime(request.headers['if-modified-since']):
+                return Response(status_code=304, headers=headers)
+        except (TypeError, ValueError):
+            pass
+
+    try:
+        size = await run_blocking(hdfs.size, hdfs_path)
+    except HDFSError as e:
+        return HTMLResponse(f"HDFS read failed: {e}", status_code=500)
+    # 文件为空
+    if size == 0:
+        return HTMLResponse("HDFS read failed: empty file", status_code=500)
+
+    status_code = 200
+    start, end = 0, size - 1
+    range_header = request.headers.get('range')
+    # If-Range 与当前ETag不一致时忽略Range,返回完整文件
+    if range_header and request.headers.get('if-range', etag) == etag:
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        if byte_range:
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    # 将二进制数据流发送给客户端(触发下载)
+    encoded_filename = quote(file_name)
+    headers["Content-Disposition"] = f"attachment; filename*=UTF-8''{encoded_filename}"
+    headers["Content-Length"] = str(end - start + 1)
+    media_type = mimetypes.guess_type(hdfs_path)[0] or "application/octet-stream"
+    return StreamingResponse(
+        stream_hdfs(hdfs_path, start, end - start + 1),
+        status_code=status_code,
+        media_type=media_type,
+        headers=headers,
+    )
+
+@app.get('/suggest')
+async def suggest(q: str = "", limit: int = Query(default=SUGGEST_LIMIT, ge=1)):
+    """输入联想: 仅查询内存前缀索引,不访问HBase(可在每次按键时调用)"""
+    return JSONResponse({'query': q, 'suggestions': suggest_index.suggest(q, limit)})
+
+@app.get('/stats')
+async def stats():
+    """运行状态: 连接池等待时间、存储线程池积压、查询缓存命中率"""
+    return JSONResponse({
+        'hbase_pool': app.state.db_pool.stats(),
+        'result_cache': result_cache.stats(),
+        'suggest_index': suggest_index.stats(),
+        'storage_executor': {
+            'workers': STORAGE_WORKERS,
+            'queued': app.state.executor._work_queue.qsize(),
+        },
+    })
+
+@app.get('/metrics')
+async def metrics_endpoint():
+    """Prometheus文本格式指标: 请求延迟、各阶段耗时、连接池与缓存统计"""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
 
 if __name__ == '__main__':
     # Uvicorn ASGI服务器启动(监听0.0.0.0的5000端口)
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from contextlib import contextmanager
+
+import happybase
+
+import metrics
+
+POOL_WAIT = metrics.histogram('webapp_hbase_pool_wait_seconds', 'Time spent waiting to borrow an HBase connection')
+
+
+# HBase connection pool
+# 职责: 进程级共享Thrift连接池(替代每个请求新建连接),并统计借用等待时间用于调优池大小
+# 健康检查: 连接空闲超过 health_check_interval 秒时先做一次轻量探测,失败则重建
+class HBasePool:
+    def __init__(self, host, port=9090, size=10, timeout=5000, acquire_timeout=5.0,
+                 health_check_interval=60.0):
+        self.host = host
+        self.port = port
+        self.size = size
+        self.timeout = timeout
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+
+        self._pool = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0          # 借用次数
+        self.wait_total = 0.0       # 累计等待时间(秒)
+        self.wait_max = 0.0         # 最大等待时间(秒)
+        self.timeouts = 0           # 等待超时次数(池已耗尽)
+        self.reconnects = 0         # 健康检查失败后的重建次数
+
+    def _get_pool(self):
+        # 延迟创建: HBase启动晚于Web应用时,首个请求再建立连接池
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = happybase.ConnectionPool(
+                        size=self.size, host=self.host, port=self.port, timeout=self.timeout)
+        return self._pool
+
+    def _health_check(self, conn):
+        last_used = getattr(conn, '_pool_last_used', None)
+        if last_used is None or time.monotonic() - last_used < self.health_check_interval:
+            return
+        try:
+            conn.tables()
+        except Exception:
+            # 连接已失效(如服务端超时断开): 关闭后重新打开
+            with self._stats_lock:
+                self.reconnects += 1
+            conn.close()
+            conn.open()
+
+    @contextmanager
+    def connection(self):
+        """借用一个连接(with语句结束自动归还)
+
+        异常:
+            happybase.NoConnectionsAvailable: 等待超过 acquire_timeout 仍无空闲连接
+        """
+        pool = self._get_pool()
+        start = time.perf_counter()
+        try:
+            cm = pool.connection(timeout=self.acquire_timeout)
+            conn = cm.__enter__()
+        except happybase.NoConnectionsAvailable:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        waited = time.perf_counter() - start
+        POOL_WAIT.observe(waited)
+        with self._stats_lock:
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+        try:
+            self._health_check(conn)
+            yield conn
+        except BaseException as e:
+            conn._pool_last_used = time.monotonic()
+            # 交由happybase处理异常(Thrift/Socket错误时替换连接)
+            if not cm.__exit__(type(e), e, e.__traceback__):
+                raise
+        else:
+            conn._pool_last_used = time.monotonic()
+            cm.__exit__(None, None, None)
+
+    def stats(self):
+        # 连接池统计(毫秒),用于评估池大小是否足够
+        with self._stats_lock:
+            return {
+                'size': self.size,
+                'checkouts': self.checkouts,
+                'wait_avg_ms': round(self.wait_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                'wait_max_ms': round(self.wait_max * 1000, 3),
+                'timeouts': self.timeouts,
+                'reconnects': self.reconnects,
+            }
+
+    def close(self):
+        # happybase连接池无显式关闭接口,逐个关闭队列中的空闲连接
+        if self._pool is None:
+            return
+        while True:
+            try:
+                conn = self._pool._queue.get_nowait()
+            except Exception:
+                break
+            conn.close()
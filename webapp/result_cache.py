@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_query(query):
+    # 缓存键归一化: 小写 + 合并空白
+    return ' '.join(query.lower().split())
+
+
+# Result cache
+# 职责: 缓存查询的排序结果(行键+得分列表)与命中总数,翻页直接切片,无需重新检索
+# 淘汰: LRU + 内存预算(max_bytes) + TTL; 爬虫写入新数据后按"数据版本号"整体失效
+class ResultCache:
+    # 单条命中记录的估算开销(行键bytes + 得分float + tuple/列表槽位)
+    HIT_OVERHEAD = 120
+    ENTRY_OVERHEAD = 200
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, ttl=300.0, check_interval=10.0):
+        """
+        参数:
+            max_bytes: 缓存内存预算(估算值)
+            ttl: 条目存活时间(秒)
+            check_interval: 数据版本号检查间隔(秒),避免每次查询都访问HBase
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.check_interval = check_interval
+
+        self._entries = OrderedDict()   # key -> (过期时间, 估算字节数, (ranked, total))
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._generation = None
+        self._last_check = 0.0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _estimate(self, key, ranked):
+        return self.ENTRY_OVERHEAD + len(str(key)) * 4 + sum(len(k) + self.HIT_OVERHEAD for k, _ in ranked)
+
+    def get(self, key):
+        # 返回 (ranked, total); 未命中或已过期返回None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, size, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                self._bytes -= size
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, ranked, total):
+        size = self._estimate(key, ranked)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old:
+                self._bytes -= old[1]
+            self._entries[key] = (time.monotonic() + self.ttl, size, (ranked, total))
+            self._bytes += size
+            # 超出预算时从最久未使用的条目开始淘汰
+            while self._bytes > self.max_bytes:
+                _, (_, evicted, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.invalidations += 1
+
+    def check_generation(self, fetch_generation):
+        """按间隔检查数据版本号,变化时清空缓存
+
+        参数:
+            fetch_generation: 无参函数,返回当前数据版本号(爬虫每写入新文档递增)
+        """
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        try:
+            generation = fetch_generation()
+        except Exception:
+            # 版本号不可用(如索引表尚未创建)时仅依赖TTL过期
+            return
+        if self._generation is not None and generation != self._generation:
+            self.clear()
+        self._generation = generation
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
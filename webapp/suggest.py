@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+import bisect
+import heapq
+import os
+import threading
+import time
+from collections import Counter
+
+
+# Suggest index
+# 职责: 输入联想(前缀匹配),数据来自全表 meta:title 分词与 index:keywords,按文档频率排序
+# 结构: 按小写形式排序的词项数组 + 二分查找确定前缀区间; 单字前缀预先计算top-k(区间过大)
+# 刷新: build() 生成新快照后整体替换引用,查询无需加锁
+class SuggestIndex:
+    def __init__(self, limit=8, min_df=1):
+        """
+        参数:
+            limit: 每个前缀返回的候选数上限
+            min_df: 入选词项的最小文档频率(过滤噪声)
+        """
+        self.limit = limit
+        self.min_df = min_df
+        self._snapshot = ([], [], [], {})   # (小写词项, 原词项, 文档频率, 单字前缀top-k)
+        self._lock = threading.Lock()       # 仅用于串行化重建
+        self.built_at = None
+        self.build_seconds = 0.0
+        self.docs = 0
+
+    def __len__(self):
+        return len(self._snapshot[0])
+
+    @staticmethod
+    def document_terms(title, keywords, tokenize):
+        # 单个文档贡献的词项集合: 标题分词(去扩展名) + 离线关键词
+        terms = {t for t in tokenize(os.path.splitext(title)[0]) if len(t) > 1}
+        terms.update(k.strip() for k in keywords.split(',') if k.strip())
+        return terms
+
+    def build(self, rows, tokenize):
+        """由 (标题, 关键词) 序列重建索引
+
+        参数:
+            rows: 可迭代的 (标题, 逗号分隔关键词)
+            tokenize: 分词函数(与检索一致)
+        """
+        with self._lock:
+            start = time.perf_counter()
+            df = Counter()
+            docs = 0
+            for title, keywords in rows:
+                df.update(self.document_terms(title, keywords, tokenize))
+                docs += 1
+
+            entries = sorted((term.lower(), term, n) for term, n in df.items() if n >= self.min_df)
+            keys = [e[0] for e in entries]
+            terms = [e[1] for e in entries]
+            freqs = [e[2] for e in entries]
+
+            # 单字前缀的候选区间可能包含数千词项,预先计算top-k
+            short = {}
+            for i, key in enumerate(keys):
+                short.setdefault(key[:1], []).append(i)
+            short = {p: [terms[i] for i in heapq.nlargest(self.limit, idx, key=lambda i: (freqs[i], -len(keys[i])))]
+                     for p, idx in short.items()}
+
+            self._snapshot = (keys, terms, freqs, short)
+            self.docs = docs
+            self.built_at = time.time()
+            self.build_seconds = time.perf_counter() - start
+            return len(keys)
+
+    def suggest(self, prefix, limit=None):
+        """前缀联想
+
+        返回:
+            [词项] 按文档频率降序(同频时较短者优先)
+        """
+        limit = min(limit or self.limit, self.limit)
+        prefix = prefix.strip().lower()
+        if not prefix:
+            return []
+        keys, terms, freqs, short = self._snapshot
+        if len(prefix) == 1:
+            return short.get(prefix, [])[:limit]
+        lo = bisect.bisect_left(keys, prefix)
+        hi = bisect.bisect_left(keys, prefix + '\uffff', lo)
+        best = heapq.nlargest(limit, range(lo, hi), key=lambda i: (freqs[i], -len(keys[i])))
+        return [terms[i] for i in best]
+
+    def stats(self):
+        return {
+            'terms': len(self),
+            'docs': self.docs,
+            'built_at': time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.built_at)) if self.built_at else None,
+            'build_seconds': round(self.build_seconds, 3),
+        }